@@ -1,14 +1,141 @@
-import argparse
-import json
 import os
 import sys
-from typing import Any, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
 
 from llm_wrapper_mcp_server.llm_client_parts._llm_client_core import LLMClient # Updated import
+from llm_wrapper_mcp_server import json_codec
+from llm_wrapper_mcp_server.line_reader import LineReader
 from llm_wrapper_mcp_server.logger import get_logger
 
 logger = get_logger(__name__)
 
+USAGE = """usage: python -m ask_online_question_mcp_server [options]
+
+Ask Online Question MCP Server
+
+options:
+  -h, --help                    show this help message and exit
+  --model MODEL                 The LLM model to use for answering questions
+                                (default: perplexity/llama-3.1-sonar-small-128k-online)
+  --system-prompt-path PATH     Path to the system prompt file (default: config/prompts/system.txt)
+  --llm-api-base-url URL        Base URL for the LLM API (e.g., 'https://api.openrouter.ai/api/v1')
+  --disable-logging             Disable LLM usage logging
+  --disable-rate-limiting       Disable pacing of LLM API calls and retries on HTTP 429
+  --disable-audit-log           Disable audit logging of prompts and replies
+  --enable-response-cache       Answer repeated identical questions from an in-memory
+                                cache; hits are not logged or audited (default: off)
+  --max-concurrent-requests N   Number of tools/call requests answered in parallel
+                                (default: 1, sequential)
+"""
+
+# Options taking a value, mapped to their destination names
+_VALUE_OPTIONS = {
+    "--model": "model",
+    "--system-prompt-path": "system_prompt_path",
+    "--llm-api-base-url": "llm_api_base_url",
+    "--max-concurrent-requests": "max_concurrent_requests",
+}
+# Switches that turn a default-on feature off
+_DISABLE_FLAGS = {
+    "--disable-logging": "enable_logging",
+    "--disable-rate-limiting": "enable_rate_limiting",
+    "--disable-audit-log": "enable_audit_log",
+}
+# Switches that turn a default-off feature on
+_ENABLE_FLAGS = {
+    "--enable-response-cache": "enable_response_cache",
+}
+
+
+def _usage_error(message: str) -> None:
+    sys.stderr.write(f"{USAGE}\nerror: {message}\n")
+    sys.exit(2)
+
+
+def _parse_argv(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Parse the command line without argparse to keep server startup fast."""
+    options: Dict[str, Any] = {
+        "model": "perplexity/llama-3.1-sonar-small-128k-online",
+        "system_prompt_path": "config/prompts/system.txt",
+        "llm_api_base_url": None,
+        "enable_logging": True,
+        "enable_rate_limiting": True,
+        "enable_audit_log": True,
+        "enable_response_cache": False,
+        "max_concurrent_requests": "1",
+    }
+    args = iter(sys.argv[1:] if argv is None else argv)
+    for arg in args:
+        name, has_value, value = arg.partition("=")
+        if arg in ("-h", "--help"):
+            sys.stdout.write(USAGE)
+            sys.exit(0)
+        elif name in _VALUE_OPTIONS:
+            if not has_value:
+                value = next(args, None)
+                if value is None:
+                    _usage_error(f"argument {name}: expected one argument")
+            options[_VALUE_OPTIONS[name]] = value
+        elif arg in _DISABLE_FLAGS:
+            options[_DISABLE_FLAGS[arg]] = False
+        elif arg in _ENABLE_FLAGS:
+            options[_ENABLE_FLAGS[arg]] = True
+        else:
+            _usage_error(f"unrecognized arguments: {arg}")
+
+    try:
+        options["max_concurrent_requests"] = int(options["max_concurrent_requests"])
+    except ValueError:
+        _usage_error(
+            "argument --max-concurrent-requests: invalid int value: "
+            f"'{options['max_concurrent_requests']}'"
+        )
+    return options
+
+
+class InvalidRequestError(ValueError):
+    """Raised when a decoded message is not a well-formed JSON-RPC request."""
+
+    def __init__(self, request_id: Any, reason: str) -> None:
+        super().__init__(reason)
+        self.request_id = request_id
+
+
+class JsonRpcRequest:
+    """The fields of a JSON-RPC request, read and validated once from the decoded message."""
+
+    __slots__ = ("id", "method", "name", "args")
+
+    def __init__(self, id: Any, method: Optional[str], name: Optional[str], args: Dict[str, Any]) -> None:
+        self.id = id
+        self.method = method
+        self.name = name
+        self.args = args
+
+    @classmethod
+    def from_message(cls, message: Any) -> "JsonRpcRequest":
+        """Build a request from a decoded message, raising InvalidRequestError on a bad shape."""
+        if not isinstance(message, dict):
+            raise InvalidRequestError(None, "Expected a JSON-RPC request object")
+        request_id = message.get("id")
+        method = message.get("method")
+        if not isinstance(method, str):
+            raise InvalidRequestError(request_id, "Request 'method' must be a string")
+        params = message.get("params")
+        if params is None:
+            params = {}
+        elif not isinstance(params, dict):
+            raise InvalidRequestError(request_id, "Request 'params' must be an object")
+        args = params.get("arguments")
+        if args is None:
+            args = {}
+        elif not isinstance(args, dict):
+            raise InvalidRequestError(request_id, "Tool 'arguments' must be an object")
+        return cls(request_id, method, params.get("name"), args)
+
+
 class AskOnlineQuestionServer:
     """
     MCP server for asking online questions using a fixed LLM model.
@@ -23,11 +150,15 @@ class AskOnlineQuestionServer:
         server_description: str = "MCP server for asking online questions using a fixed LLM model.",
         enable_logging: bool = True,
         enable_rate_limiting: bool = True,
-        enable_audit_log: bool = True
+        enable_audit_log: bool = True,
+        max_concurrent_requests: int = 1,
+        enable_response_cache: bool = False
     ) -> None:
         """
         Initialize the server with configuration options.
         The LLM model is fixed and passed during initialization.
+        With max_concurrent_requests > 1, tools/call requests are answered
+        from a thread pool so slow LLM calls no longer block the stdin loop.
         """
         self.llm_client = LLMClient(
             system_prompt_path=system_prompt_path,
@@ -35,10 +166,13 @@ class AskOnlineQuestionServer:
             api_base_url=llm_api_base_url,
             enable_logging=enable_logging,
             enable_rate_limiting=enable_rate_limiting,
-            enable_audit_log=enable_audit_log
+            enable_audit_log=enable_audit_log,
+            cache_enabled=enable_response_cache
         )
         self.server_name = server_name
         self.server_description = server_description
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
+        self._stdout_lock = threading.Lock()
         self.tools = {
             "ask_online_question": {
                 "description": "Asks an online question using the configured LLM.",
@@ -54,153 +188,199 @@ class AskOnlineQuestionServer:
                 }
             }
         }
+        self._capabilities = {
+            "protocolVersion": "2024-11-05",
+            "serverInfo": {
+                "name": self.server_name,
+                "version": "0.1.0",
+                "description": self.server_description
+            },
+            "capabilities": {
+                "tools": self.tools,
+                "resources": {},
+                "prompts": {},
+                "sampling": {}
+            }
+        }
+        # The handshake, initialize and tools/list answers never change, so
+        # serialize them once and only splice in the request id per call.
+        self._initialize_tail = json_codec.prebuild_tail(result=self._capabilities)
+        self._tools_list_tail = json_codec.prebuild_tail(result={"tools": self.tools})
+        self._dispatch = {
+            "initialize": self._handle_initialize,
+            "tools/list": self._handle_tools_list,
+            "tools/call": self._handle_tools_call,
+        }
         logger.debug(f"{self.server_name} server initialized with model: {model}")
 
+    @classmethod
+    def cli(cls, argv: Optional[List[str]] = None) -> None:
+        """Build a server from command-line arguments and run it."""
+        options = _parse_argv(argv)
+        server = cls(
+            model=options["model"],
+            system_prompt_path=options["system_prompt_path"],
+            llm_api_base_url=options["llm_api_base_url"],
+            enable_logging=options["enable_logging"],
+            enable_rate_limiting=options["enable_rate_limiting"],
+            enable_audit_log=options["enable_audit_log"],
+            max_concurrent_requests=options["max_concurrent_requests"],
+            enable_response_cache=options["enable_response_cache"]
+        )
+        server.run()
+
     def send_response(self, response: Dict[str, Any]) -> None:
         """Send a JSON-RPC response to stdout."""
         try:
-            response_str = json.dumps(response) + "\n"
-            sys.stdout.write(response_str)
-            sys.stdout.flush()
+            # Responses may come from worker threads; keep each line intact
+            data = json_codec.dumps(response)
+            with self._stdout_lock:
+                json_codec.write_line(data)
         except Exception as e:
             logger.error("Error sending response to stdout: %s", str(e))
             raise
 
-    def handle_request(self, request: Dict[str, Any]) -> None:
-        """Handle an incoming JSON-RPC request."""
-        method = request.get("method")
-        request_id = request.get("id")
+    def send_frame(self, data: bytes) -> None:
+        """Send an already serialized JSON-RPC frame to stdout."""
+        try:
+            with self._stdout_lock:
+                json_codec.write_line(data)
+        except Exception as e:
+            logger.error("Error sending response to stdout: %s", str(e))
+            raise
 
-        if method == "initialize":
-            logger.debug("Handling initialize request.")
-            self.send_response({
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "serverInfo": {
-                        "name": self.server_name,
-                        "version": "0.1.0",
-                        "description": self.server_description
-                    },
-                    "capabilities": {
-                        "tools": self.tools,
-                        "resources": {},
-                        "prompts": {},
-                        "sampling": {}
-                    }
-                }
-            })
-        elif method == "tools/list":
-            logger.debug("Handling tools/list request.")
-            self.send_response({
+    def handle_request(self, request: Union[Dict[str, Any], List[Any]]) -> None:
+        """Handle an incoming JSON-RPC request or batch of requests."""
+        if isinstance(request, list):
+            self.send_frame(self._handle_batch(request))
+        else:
+            self.send_frame(self._handle_message(request))
+
+    def _handle_message(self, message: Any) -> bytes:
+        """Validate and handle one decoded message, returning its response frame."""
+        try:
+            req = JsonRpcRequest.from_message(message)
+        except InvalidRequestError as e:
+            logger.warning(f"Invalid request: {e}")
+            return self._error_frame(e.request_id, -32600, "Invalid Request", str(e))
+        return self._handle_one(req)
+
+    def _handle_one(self, req: JsonRpcRequest) -> bytes:
+        """Handle a single request and return its serialized response frame."""
+        try:
+            return self._dispatch.get(req.method, self._handle_unknown_method)(req)
+        except Exception as e:
+            logger.error(f"Error handling '{req.method}' request: {e}")
+            return self._error_frame(
+                req.id, -32000, "Internal error",
+                "Internal server error. Check server logs for details."
+            )
+
+    def _handle_batch(self, batch: List[Any], executor: Optional[ThreadPoolExecutor] = None) -> bytes:
+        """Handle a JSON-RPC batch, answering with a single array frame."""
+        if not batch:
+            return self._error_frame(None, -32600, "Invalid Request", "Empty batch")
+        if executor is not None:
+            frames = executor.map(self._handle_message, batch)
+        else:
+            frames = map(self._handle_message, batch)
+        return b"[" + b",".join(frames) + b"]"
+
+    def _error_frame(self, request_id: Any, code: int, message: str, data: str) -> bytes:
+        return json_codec.dumps({
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": code,
+                "message": message,
+                "data": data
+            }
+        })
+
+    def _handle_initialize(self, req: JsonRpcRequest) -> bytes:
+        logger.debug("Handling initialize request.")
+        return json_codec.frame(req.id, self._initialize_tail)
+
+    def _handle_tools_list(self, req: JsonRpcRequest) -> bytes:
+        logger.debug("Handling tools/list request.")
+        return json_codec.frame(req.id, self._tools_list_tail)
+
+    def _handle_tools_call(self, req: JsonRpcRequest) -> bytes:
+        if req.name != "ask_online_question":
+            logger.warning(f"Tool not found: {req.name}")
+            return self._error_frame(req.id, -32601, "Method not found", f"Tool '{req.name}' not found")
+
+        prompt = req.args.get("prompt")
+        if not prompt:
+            logger.warning("Missing required 'prompt' argument for 'ask_online_question'.")
+            return self._error_frame(req.id, -32602, "Invalid params", "Missing required 'prompt' argument")
+
+        try:
+            response = self.llm_client.generate_response(prompt=prompt)
+            return json_codec.dumps({
                 "jsonrpc": "2.0",
-                "id": request_id,
+                "id": req.id,
                 "result": {
-                    "tools": self.tools
+                    "content": [{
+                        "type": "text",
+                        "text": response["response"]
+                    }],
+                    "isError": False
                 }
             })
-        elif method == "tools/call":
-            params = request.get("params", {})
-            name = params.get("name")
-            args = params.get("arguments", {})
-
-            if name == "ask_online_question":
-                prompt = args.get("prompt")
-                if not prompt:
-                    logger.warning("Missing required 'prompt' argument for 'ask_online_question'.")
-                    self.send_response({
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32602,
-                            "message": "Invalid params",
-                            "data": "Missing required 'prompt' argument"
-                        }
-                    })
-                    return
-
-                try:
-                    response = self.llm_client.generate_response(prompt=prompt)
-                    mcp_response = {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "content": [{
-                                "type": "text",
-                                "text": response["response"]
-                            }],
-                            "isError": False
-                        }
-                    }
-                    self.send_response(mcp_response)
-                except Exception as e:
-                    logger.error(f"Error during 'ask_online_question' execution: {e}")
-                    self.send_response({
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32000, # Or MCP_ERROR_INTERNAL if constants were added
-                            "message": "Internal error",
-                            "data": "Internal server error. Check server logs for details."
-                        },
-                        "isError": True
-                    })
-            else:
-                logger.warning(f"Tool not found: {name}")
-                self.send_response({
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32601,
-                        "message": "Method not found",
-                        "data": f"Tool '{name}' not found"
-                    }
-                })
-        else:
-            logger.warning(f"Method not found: {method}")
-            self.send_response({
+        except Exception as e:
+            logger.error(f"Error during 'ask_online_question' execution: {e}")
+            return json_codec.dumps({
                 "jsonrpc": "2.0",
-                "id": request_id,
+                "id": req.id,
                 "error": {
-                    "code": -32601,
-                    "message": "Method not found",
-                    "data": f"Method '{method}' not found"
-                }
+                    "code": -32000, # Or MCP_ERROR_INTERNAL if constants were added
+                    "message": "Internal error",
+                    "data": "Internal server error. Check server logs for details."
+                },
+                "isError": True
             })
 
+    def _handle_unknown_method(self, req: JsonRpcRequest) -> bytes:
+        logger.warning(f"Method not found: {req.method}")
+        return self._error_frame(req.id, -32601, "Method not found", f"Method '{req.method}' not found")
+
+    def _handle_message_in_worker(self, message: Dict[str, Any]) -> None:
+        """Handle a request on a worker thread and send its response."""
+        self.send_frame(self._handle_message(message))
+
     def run(self) -> None:
         """Run the server, reading from stdin and writing to stdout."""
         logger.debug("AskOnlineQuestionServer run method started. Sending initial capabilities.")
-        self.send_response({
-            "jsonrpc": "2.0",
-            "id": None,
-            "result": {
-                "protocolVersion": "2024-11-05",
-                "serverInfo": {
-                    "name": self.server_name,
-                    "version": "0.1.0",
-                    "description": self.server_description
-                },
-                "capabilities": {
-                    "tools": self.tools,
-                    "resources": {},
-                    "prompts": {},
-                    "sampling": {}
-                }
-            }
-        })
+        self.send_frame(json_codec.frame(None, self._initialize_tail))
         logger.debug("Initial capabilities sent. Entering main request loop.")
+        executor = None
+        if self.max_concurrent_requests > 1:
+            executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_requests,
+                thread_name_prefix="ask-online-question"
+            )
         try: # Outer try for the finally block
+            reader = LineReader(sys.stdin)
             while True:
-                line = sys.stdin.readline()
-                if not line:
-                    logger.info("Empty line or EOF received from stdin. Breaking loop.")
+                line = reader.readline()
+                if line is None:
+                    logger.info("EOF received from stdin. Breaking loop.")
                     break
                 try:
-                    request = json.loads(line)
-                    self.handle_request(request)
-                except json.JSONDecodeError:
+                    request = json_codec.loads(line)
+                    if isinstance(request, list):
+                        # Batches are answered with one array frame and a single flush
+                        self.send_frame(self._handle_batch(request, executor))
+                    elif (
+                        executor is not None
+                        and isinstance(request, dict)
+                        and request.get("method") == "tools/call"
+                    ):
+                        executor.submit(self._handle_message_in_worker, request)
+                    else:
+                        self.send_frame(self._handle_message(request))
+                except json_codec.JSONDecodeError:
                     logger.error("Parse error: Invalid JSON received from stdin.")
                     self.send_response({
                         "jsonrpc": "2.0",
@@ -226,38 +406,12 @@ class AskOnlineQuestionServer:
             logger.critical(f"Fatal error in AskOnlineQuestionServer run loop: {e}")
             raise
         finally:
+            if executor is not None:
+                logger.debug("Waiting for in-flight requests to finish.")
+                executor.shutdown(wait=True)
             logger.debug("Ensuring LLMClient resources are closed.")
             if hasattr(self, 'llm_client') and self.llm_client:
                 try:
                     self.llm_client.close()
                 except Exception as e:
                     logger.warning(f"Error closing LLMClient: {e}")
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Ask Online Question MCP Server")
-    parser.add_argument(
-        "--model",
-        type=str,
-        required=True,
-        help="The LLM model to use for answering questions (e.g., 'perplexity/llama-3.1-sonar-small-128k-online')"
-    )
-    parser.add_argument(
-        "--system-prompt-path",
-        type=str,
-        default="config/prompts/system.txt",
-        help="Path to the system prompt file."
-    )
-    parser.add_argument(
-        "--llm-api-base-url",
-        type=str,
-        default=None,
-        help="Base URL for the LLM API (e.g., 'https://api.openrouter.ai/api/v1')."
-    )
-    args = parser.parse_args()
-
-    server = AskOnlineQuestionServer(
-        model=args.model,
-        system_prompt_path=args.system_prompt_path,
-        llm_api_base_url=args.llm_api_base_url
-    )
-    server.run()
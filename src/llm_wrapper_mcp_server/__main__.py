@@ -3,31 +3,58 @@ Main entry point for the MCP server.
 """
 
 import argparse
+import atexit
+import functools
 import os
+import queue
 import sys
 import logging
-from typing import Optional, List  # Added List and Any for type hints
+import logging.handlers
+from typing import FrozenSet, Optional, List  # Added List and Any for type hints
+
+from llm_wrapper_mcp_server.logger import (
+    TRACE_LEVEL,
+    BufferedFileHandler,
+    FlushingQueueListener,
+    LocalQueueHandler,
+)
 
 # Global logger for this module, configured in main or _configure_logging
 logger = logging.getLogger(__name__)
 
+# Background thread writing queued log records to the log file
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
 
 def _handle_cwd_arg() -> List[str]:
     """Handles --cwd argument and changes directory if specified. Returns remaining args."""
-    # Use parse_known_args to get --cwd before full parsing
-    cwd_parser = argparse.ArgumentParser(add_help=False)
-    cwd_parser.add_argument("--cwd", help="Change working directory to this path")
-    cwd_args, remaining_args = cwd_parser.parse_known_args()
+    # --cwd has a fixed "--cwd PATH" / "--cwd=PATH" form, so scan argv for it
+    # directly rather than building a second ArgumentParser just to pre-parse it
+    remaining_args = sys.argv[1:]
+    cwd = None
+    for i, arg in enumerate(remaining_args):
+        if arg == "--":
+            break
+        if arg == "--cwd":
+            if i + 1 >= len(remaining_args):
+                print("error: argument --cwd: expected one argument", file=sys.stderr)
+                sys.exit(2)
+            cwd = remaining_args[i + 1]
+            del remaining_args[i : i + 2]
+            break
+        if arg.startswith("--cwd="):
+            cwd = arg.split("=", 1)[1]
+            del remaining_args[i]
+            break
 
-    if cwd_args.cwd:
+    if cwd:
         try:
-            os.chdir(cwd_args.cwd)
-            sys.stderr.flush()  # Keep flush for immediate feedback if needed
+            os.chdir(cwd)
         except Exception as e:
             # Use module-level logger if available, otherwise print
             # logger might not be configured yet if CWD handling is very early
             print(
-                f"Error changing working directory to {cwd_args.cwd}: {e}",
+                f"Error changing working directory to {cwd}: {e}",
                 file=sys.stderr,
             )
             sys.stderr.flush()
@@ -67,8 +94,8 @@ def _setup_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--log-level",
         default="INFO",
-        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
-        help="Logging level (default: INFO).",
+        choices=["TRACE", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        help="Logging level (default: INFO). TRACE also logs full request/response payloads.",
     )
     parser.add_argument(
         "--llm-api-base-url",
@@ -95,7 +122,7 @@ def _setup_arg_parser() -> argparse.ArgumentParser:
         "--disable-rate-limiting",
         action="store_false",
         dest="enable_rate_limiting",
-        help="Disable rate limiting (currently a placeholder).",
+        help="Disable client-side pacing of LLM API calls and retries on HTTP 429.",
     )
     parser.add_argument(
         "--disable-audit-log",
@@ -103,6 +130,12 @@ def _setup_arg_parser() -> argparse.ArgumentParser:
         dest="enable_audit_log",
         help="Disable audit logging of prompts and replies.",
     )
+    parser.add_argument(
+        "--enable-response-cache",
+        action="store_true",
+        help="Answer repeated identical prompts from an in-memory cache. Cache hits "
+        "are not recorded in usage logging or the audit log (default: off)",
+    )
     parser.add_argument(
         "--skip-outbound-key-leaks",
         action="store_true",
@@ -113,32 +146,81 @@ def _setup_arg_parser() -> argparse.ArgumentParser:
         type=int,
         help="Maximum number of tokens to generate in the LLM response",
     )
+    parser.add_argument(
+        "--max-concurrent-requests",
+        type=int,
+        default=1,
+        help="Number of tools/call requests answered in parallel (default: 1)",
+    )
     return parser
 
 
+def _stop_log_listener() -> None:
+    """Flush queued log records and stop the background log writer."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.flush()
+        _log_listener = None
+
+
+atexit.register(_stop_log_listener)
+
+
 def _configure_logging(log_file: str, log_level_str: str) -> None:
     """Configures logging for the application."""
     log_dir = os.path.dirname(log_file)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
 
-    log_level_val = getattr(logging, log_level_str.upper(), logging.INFO)
+    level_name = log_level_str.upper()
+    if level_name == "TRACE":
+        log_level_val = TRACE_LEVEL
+    else:
+        log_level_val = getattr(logging, level_name, logging.INFO)
 
-    # Use basicConfig with force=True if re-configuration is possible,
-    # or ensure it's only called once.
-    # For a script entry point, direct basicConfig is usually fine.
+    # Request threads only enqueue records; a background listener thread
+    # formats them and does the file I/O.
+    global _log_listener
+    previous_listener = _log_listener
+    # Buffered: flushed on WARNING+ records, whenever the queue runs dry,
+    # and at exit
+    file_handler = BufferedFileHandler(log_file, mode="a", delay=True)
+    file_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    )
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    # Messages and tracebacks are formatted on the listener thread too
+    queue_handler = LocalQueueHandler(log_queue)
+    _log_listener = FlushingQueueListener(log_queue, file_handler)
+    _log_listener.start()
+
+    # force=True replaces the handler from any earlier call, which would
+    # otherwise keep feeding a queue that is no longer drained
     logging.basicConfig(
-        filename=log_file,
         level=log_level_val,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        filemode="a",
+        handlers=[queue_handler],
+        force=True,
     )
+    if previous_listener is not None:
+        # Drain what was logged through the old handler before the swap
+        previous_listener.stop()
+        for handler in previous_listener.handlers:
+            handler.close()
     # Global logger for this module is already defined at the top.
     # Re-fetch or ensure it uses the new basicConfig settings.
     # logging.getLogger(__name__) would return the same logger instance.
     logger.debug("Logging configured.")
 
 
+@functools.lru_cache(maxsize=8)
+def _load_allowed_models(path: str, mtime_ns: int) -> FrozenSet[str]:
+    """Read the allowed models file; cached until the file's mtime changes."""
+    with open(path, "r") as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+
 def _validate_allowed_models(
     args_model: str, allowed_models_file_path: Optional[str]
 ) -> None:
@@ -146,11 +228,13 @@ def _validate_allowed_models(
     if not allowed_models_file_path:
         return  # No validation needed if file not specified
 
-    allowed_models: List[str] = []
-    if os.path.exists(allowed_models_file_path):
-        with open(allowed_models_file_path, "r") as f:
-            allowed_models = [line.strip() for line in f if line.strip()]
-    else:
+    # One stat() both checks for the file and keys the cache; a file removed
+    # before it is opened is reported the same way
+    try:
+        allowed_models = _load_allowed_models(
+            allowed_models_file_path, os.stat(allowed_models_file_path).st_mtime_ns
+        )
+    except FileNotFoundError:
         logger.warning(f"Allowed models file not found: {allowed_models_file_path}")
         sys.exit(1)
 
@@ -174,8 +258,6 @@ def _validate_allowed_models(
 
 def main() -> None:
     """Run the MCP server."""
-    sys.stderr.flush()  # Initial flush
-
     remaining_args = _handle_cwd_arg()
 
     parser = _setup_arg_parser()
@@ -195,10 +277,12 @@ def main() -> None:
         enable_logging=args.enable_logging,
         enable_rate_limiting=args.enable_rate_limiting,
         enable_audit_log=args.enable_audit_log,
+        enable_response_cache=args.enable_response_cache,
         skip_outbound_key_checks=args.skip_outbound_key_leaks,
         max_tokens=args.max_tokens,
         server_name=args.server_name,
         server_description=args.server_description,
+        max_concurrent_requests=args.max_concurrent_requests,
         # Note: max_user_prompt_tokens is available on args if needed by LLMMCPWrapper constructor
         # For now, assuming LLMMCPWrapper uses its default or it's not passed from here.
         # If it should be passed: max_user_prompt_tokens=args.limit_user_prompt_length
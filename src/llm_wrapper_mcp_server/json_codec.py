@@ -0,0 +1,78 @@
+"""JSON helpers for the STDIO transport, using orjson when it is installed."""
+
+import itertools
+import json
+import sys
+from typing import Any, Iterable, Optional, TextIO
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speed-up
+    orjson = None
+
+if orjson is not None:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError
+    JSONDecodeError = orjson.JSONDecodeError
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+    # json.dumps() builds a new encoder per call when given any option, so
+    # keep one; json.loads() already reuses a shared default decoder
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact UTF-8 JSON bytes."""
+        return _encoder.encode(obj).encode("utf-8")
+
+    loads = json.loads
+
+
+def write_line(data: bytes, stream: Optional[TextIO] = None) -> None:
+    """Write one newline-terminated JSON frame to stream (stdout by default)."""
+    write_lines((data,), stream)
+
+
+def write_lines(frames: Iterable[bytes], stream: Optional[TextIO] = None) -> None:
+    """Write frames as newline-terminated lines with a single write and flush."""
+    stream = stream if stream is not None else sys.stdout
+    # The trailing empty item adds the final newline within the same join,
+    # so the joined burst is not copied again to append it
+    data = b"\n".join(itertools.chain(frames, (b"",)))
+    buffer = getattr(stream, "buffer", None)
+    if buffer is not None:
+        buffer.write(data)
+        buffer.flush()
+    else:
+        # Text-only streams (e.g. io.StringIO replacing stdout)
+        stream.write(data.decode("utf-8"))
+        stream.flush()
+
+
+def prebuild_tail(**members: Any) -> bytes:
+    """Serialize the static members that follow "id" in a JSON-RPC frame.
+
+    The result is meant to be passed to frame(), so constant responses are
+    serialized once instead of on every request.
+    """
+    return dumps(members)[1:]
+
+
+def frame(request_id: Any, tail: bytes) -> bytes:
+    """Build a JSON-RPC 2.0 frame from a request id and a prebuilt tail."""
+    return b'{"jsonrpc":"2.0","id":' + dumps(request_id) + b"," + tail
+
+
+def prebuild_error(code: int, message: str) -> bytes:
+    """Serialize the constant code/message part of a JSON-RPC error for error_frame()."""
+    return b',"error":' + dumps({"code": code, "message": message})[:-1] + b',"data":'
+
+
+def error_frame(request_id: Any, prebuilt: bytes, data: Any) -> bytes:
+    """Build a JSON-RPC 2.0 error frame from a prebuilt error and its data."""
+    return b'{"jsonrpc":"2.0","id":' + dumps(request_id) + prebuilt + dumps(data) + b"}}"
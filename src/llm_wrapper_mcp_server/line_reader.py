@@ -0,0 +1,63 @@
+"""Batched reader for newline-delimited JSON-RPC frames on stdin."""
+
+import io
+import os
+import sys
+from collections import deque
+from typing import Deque, Optional, TextIO
+
+
+class LineReader:
+    """Read newline-delimited frames, draining many frames per read call.
+
+    On a real file descriptor a single os.read() returns everything the peer
+    has written so far (up to chunk_size), so a burst of requests costs one
+    syscall instead of one readline() per frame. In-memory binary streams fall
+    back to read1(); text-only streams fall back to readline().
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, chunk_size: int = 65536):
+        self._stream = stream if stream is not None else sys.stdin
+        self._chunk_size = chunk_size
+        self._lines: Deque[bytes] = deque()
+        # Bytes after the last newline; grown in place so a large frame split
+        # across many reads is not re-copied on every chunk
+        self._partial = bytearray()
+        self._eof = False
+
+    def readline(self) -> Optional[bytes]:
+        """Return the next frame without its trailing newline, or None on EOF."""
+        while not self._lines:
+            if self._eof:
+                if self._partial:
+                    # Last frame was not newline-terminated
+                    line = bytes(self._partial)
+                    self._partial.clear()
+                    return line
+                return None
+            chunk = self._read_chunk()
+            if not chunk:
+                self._eof = True
+                continue
+            self._partial += chunk
+            if b"\n" not in chunk:
+                continue
+            end = self._partial.rfind(b"\n")
+            self._lines.extend(bytes(self._partial[:end]).split(b"\n"))
+            del self._partial[: end + 1]
+        return self._lines.popleft()
+
+    @property
+    def has_buffered_line(self) -> bool:
+        """True if a complete frame is already buffered, so readline() won't block."""
+        return bool(self._lines)
+
+    def _read_chunk(self) -> bytes:
+        buffer = getattr(self._stream, "buffer", None)
+        if buffer is None:
+            return self._stream.readline().encode("utf-8")
+        try:
+            fd = buffer.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return buffer.read1(self._chunk_size)
+        return os.read(fd, self._chunk_size)
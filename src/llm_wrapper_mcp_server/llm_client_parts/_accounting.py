@@ -1,50 +1,91 @@
+import atexit
 import os
 import logging
-from typing import Optional
-from llm_accounting import LLMAccounting
-from llm_accounting.backends.sqlite import SQLiteBackend
-from llm_accounting.backends.mock_backend import MockBackend
-from llm_accounting.audit_log import AuditLogger
+import queue
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+from llm_accounting import LLMAccounting
+from llm_accounting.backends.sqlite import SQLiteBackend
+from llm_accounting.backends.mock_backend import MockBackend
+from llm_accounting.audit_log import AuditLogger
 from ..logger import get_logger
 
 logger = get_logger(__name__)
 logger.setLevel(logging.NOTSET)
 logger.propagate = True
 
+# Most queued writes drained and written per wakeup of the accounting thread
+ACCOUNTING_BATCH_SIZE = 64
+
+# Managers with a running accounting thread, flushed at interpreter exit
+_live_managers: "Set[LLMAccountingManager]" = set()
+
+
+def _flush_live_managers() -> None:
+    for manager in list(_live_managers):
+        manager.flush()
+
+
+atexit.register(_flush_live_managers)
+
+
+class LLMAccountingManager:
+    """Owns the llm-accounting tracker and audit logger.
+
+    Both are created on first use, so a process that never completes a
+    request does not open the database or create the data directory.
+    track_usage/log_prompt/log_response only enqueue the entry; a background
+    thread performs the database writes, draining queued entries in batches,
+    so requests never wait on SQLite commits. Call flush() to wait for them.
+    """
 
-class LLMAccountingManager:
     def __init__(self, enable_logging: bool, enable_audit_log: bool):
-        os.makedirs("data", exist_ok=True)
-
-        self.llm_tracker = None
-        if enable_logging:
-            try:
-                db_url_env = os.getenv("LLM_ACCOUNTING_DB_URL")
-                if db_url_env and "://" in db_url_env:
-                    backend = SQLiteBackend(db_path=db_url_env)
-                else:
-                    backend = MockBackend()
-                self.llm_tracker = LLMAccounting(backend=backend)
-            except Exception as e:
-                logger.error(f"Failed to initialize LLMAccounting: {e}")
-                self.llm_tracker = None
-        else:
-            logger.info("LLM accounting is disabled.")
-
-        self.audit_logger = None
-        if enable_audit_log:
-            try:
-                db_url_env = os.getenv("LLM_ACCOUNTING_DB_URL")
-                if db_url_env and "://" in db_url_env:
-                    backend = SQLiteBackend(db_path=db_url_env)
-                else:
-                    backend = MockBackend()
-                self.audit_logger = AuditLogger(backend=backend)
-            except Exception as e:
-                logger.error(f"Failed to initialize AuditLogger: {e}")
-                self.audit_logger = None
-        else:
-            logger.info("Audit logging is disabled.")
+        self._enable_logging = enable_logging
+        self._enable_audit_log = enable_audit_log
+        self._llm_tracker: Optional[LLMAccounting] = None
+        self._audit_logger: Optional[AuditLogger] = None
+        # Accounting and audit logging write to the same database, so they
+        # share one backend instead of opening two handles to the same file
+        self._backend = None
+        self._queue: "queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+        if not enable_logging:
+            logger.info("LLM accounting is disabled.")
+        if not enable_audit_log:
+            logger.info("Audit logging is disabled.")
+
+    def _get_backend(self):
+        if self._backend is None:
+            os.makedirs("data", exist_ok=True)
+            db_url_env = os.getenv("LLM_ACCOUNTING_DB_URL")
+            if db_url_env and "://" in db_url_env:
+                self._backend = SQLiteBackend(db_path=db_url_env)
+            else:
+                self._backend = MockBackend()
+        return self._backend
+
+    @property
+    def llm_tracker(self) -> Optional[LLMAccounting]:
+        if self._llm_tracker is None and self._enable_logging:
+            try:
+                self._llm_tracker = LLMAccounting(backend=self._get_backend())
+            except Exception as e:
+                logger.error(f"Failed to initialize LLMAccounting: {e}")
+                # Don't retry on every request
+                self._enable_logging = False
+        return self._llm_tracker
+
+    @property
+    def audit_logger(self) -> Optional[AuditLogger]:
+        if self._audit_logger is None and self._enable_audit_log:
+            try:
+                self._audit_logger = AuditLogger(backend=self._get_backend())
+            except Exception as e:
+                logger.error(f"Failed to initialize AuditLogger: {e}")
+                self._enable_audit_log = False
+        return self._audit_logger
 
     def get_tracker(self) -> Optional[LLMAccounting]:
         return self.llm_tracker
@@ -53,29 +94,84 @@ class LLMAccountingManager:
         return self.audit_logger
 
     def track_usage(self, **kwargs) -> None:
-        if self.llm_tracker:
-            try:
-                self.llm_tracker.track_usage(**kwargs)
-            except Exception as e:
-                logger.error(f"Failed to track LLM usage: {e}")
+        if self._enable_logging:
+            self._submit("track_usage", kwargs)
 
     def log_prompt(self, **kwargs) -> None:
-        if self.audit_logger:
-            self.audit_logger.log_prompt(**kwargs)
-
-    def log_response(self, **kwargs) -> None:
-        if self.audit_logger:
-            self.audit_logger.log_response(**kwargs)
-
-    def close(self) -> None:
-        """Close any open database connections."""
-        if self.llm_tracker and hasattr(self.llm_tracker.backend, "close"):
-            try:
-                self.llm_tracker.backend.close()
-            except Exception as e:
-                logger.warning(f"Failed to close accounting backend: {e}")
-        if self.audit_logger and hasattr(self.audit_logger.backend, "close"):
-            try:
-                self.audit_logger.backend.close()
-            except Exception as e:
-                logger.warning(f"Failed to close audit backend: {e}")
+        if self._enable_audit_log:
+            self._submit("log_prompt", kwargs)
+
+    def log_response(self, **kwargs) -> None:
+        if self._enable_audit_log:
+            self._submit("log_response", kwargs)
+
+    def _submit(self, kind: str, kwargs: Dict[str, Any]) -> None:
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._drain, name="llm-accounting", daemon=True
+                    )
+                    self._worker.start()
+                    _live_managers.add(self)
+        self._queue.put((kind, kwargs))
+
+    def _drain(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < ACCOUNTING_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                try:
+                    if item is None:
+                        stop = True
+                    else:
+                        self._write(*item)
+                finally:
+                    self._queue.task_done()
+
+    def _write(self, kind: str, kwargs: Dict[str, Any]) -> None:
+        if kind == "track_usage":
+            tracker = self.llm_tracker
+            if tracker:
+                try:
+                    tracker.track_usage(**kwargs)
+                except Exception as e:
+                    logger.error(f"Failed to track LLM usage: {e}")
+        else:
+            audit_logger = self.audit_logger
+            if audit_logger:
+                try:
+                    getattr(audit_logger, kind)(**kwargs)
+                except Exception as e:
+                    logger.error(f"Failed to write audit log entry: {e}")
+
+    def flush(self) -> None:
+        """Block until every queued accounting and audit entry is written."""
+        if self._worker is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Write pending entries, stop the accounting thread and close connections."""
+        worker = self._worker
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+            self._worker = None
+            _live_managers.discard(self)
+        backends = []
+        # Only close what was actually opened
+        for owner in (self._llm_tracker, self._audit_logger):
+            backend = getattr(owner, "backend", None) if owner else None
+            if backend is not None and not any(backend is b for b in backends):
+                backends.append(backend)
+        for backend in backends:
+            if hasattr(backend, "close"):
+                try:
+                    backend.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close accounting backend: {e}")
@@ -1,14 +1,54 @@
 import logging
+import re
+from typing import Optional, Pattern, Tuple
+
+REDACTED = "***REDACTED***"
 
 
 class ApiKeyFilter(logging.Filter):
-    """Filter to redact API keys from log messages"""
+    """Filter to redact API keys from log messages
+
+    Any number of keys can be registered. A single key is matched with a plain
+    substring check; several keys are combined into one compiled alternation
+    so each message is scanned once regardless of how many keys are known.
+    """
 
-    def __init__(self, api_key: str):
+    def __init__(self, *api_keys: str):
         super().__init__()
-        self.api_key = api_key
+        # (keys, pattern) is swapped as one tuple so filter() never sees a
+        # pattern that does not match the key list
+        self._state: Tuple[Tuple[str, ...], Optional[Pattern[str]]] = ((), None)
+        for api_key in api_keys:
+            self.add_key(api_key)
+
+    @property
+    def api_keys(self) -> Tuple[str, ...]:
+        return self._state[0]
+
+    def add_key(self, api_key: Optional[str]) -> None:
+        """Start redacting api_key; empty and already known keys are ignored."""
+        keys = self._state[0]
+        if not api_key or api_key in keys:
+            return
+        keys = keys + (api_key,)
+        pattern = None
+        if len(keys) > 1:
+            # Longest first, so a key that contains another is redacted whole
+            pattern = re.compile(
+                "|".join(re.escape(k) for k in sorted(keys, key=len, reverse=True))
+            )
+        self._state = (keys, pattern)
 
     def filter(self, record: logging.LogRecord) -> bool:
-        if self.api_key:
-            record.msg = str(record.msg).replace(self.api_key, "***REDACTED***")
+        keys, pattern = self._state
+        if keys:
+            msg = record.msg
+            if not isinstance(msg, str):
+                msg = record.msg = str(msg)
+            # Only pay for the copy in replace()/sub() when a key is present
+            if pattern is None:
+                if keys[0] in msg:
+                    record.msg = msg.replace(keys[0], REDACTED)
+            elif pattern.search(msg):
+                record.msg = pattern.sub(REDACTED, msg)
         return True
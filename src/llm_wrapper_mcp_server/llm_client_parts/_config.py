@@ -1,3 +1,4 @@
+import functools
 import os
 import logging
 from typing import Optional
@@ -8,12 +9,20 @@ logger.setLevel(logging.NOTSET)
 logger.propagate = True
 
 
+@functools.lru_cache(maxsize=8)
+def _read_system_prompt(path: str, mtime_ns: int) -> str:
+    """Read a system prompt file; cached until the file's mtime changes."""
+    with open(path, "r") as f:
+        return f.read()
+
+
 def load_system_prompt(system_prompt_path: str) -> str:
     """Loads the system prompt from the specified path."""
-    if os.path.exists(system_prompt_path):
-        with open(system_prompt_path, "r") as f:
-            return f.read()
-    else:
+    try:
+        return _read_system_prompt(
+            system_prompt_path, os.stat(system_prompt_path).st_mtime_ns
+        )
+    except FileNotFoundError:
         logger.warning(
             f"System prompt file {system_prompt_path} not found. Using empty system prompt."
         )
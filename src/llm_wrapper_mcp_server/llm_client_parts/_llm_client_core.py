@@ -1,13 +1,79 @@
+import functools
 import os
+import re
 import requests
 import tiktoken
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, Optional
-from ..logger import get_logger
+from .. import json_codec
+from ..logger import TRACE_LEVEL, get_logger
 from ._api_key_filter import ApiKeyFilter
 from ._accounting import LLMAccountingManager
 from ._config import load_system_prompt, get_api_base_url
+from ._response_cache import ResponseCache, make_cache_key
+from ._rate_limiter import RateLimiter, limits_for_base_url
+from ._semantic_cache import SemanticCache
 
 logger = get_logger(__name__)
+# One filter for every client: each new API key is added to it instead of
+# stacking another filter on the shared module logger
+_api_key_filter = ApiKeyFilter()
+logger.addFilter(_api_key_filter)
+
+# "sk-" followed by at least 29 key characters (32+ characters in total)
+_API_KEY_RE = re.compile(r"sk-[\w-]{29,}\Z")
+
+# Retries of a request answered with 429 before giving up
+RATE_LIMIT_MAX_RETRIES = 3
+
+# api_usage field -> response header carrying it
+USAGE_HEADERS = (
+    ("total_tokens", "X-Total-Tokens"),
+    ("prompt_tokens", "X-Prompt-Tokens"),
+    ("completion_tokens", "X-Completion-Tokens"),
+    ("total_cost", "X-Total-Cost"),
+    ("cached_tokens", "X-Cached-Tokens"),
+    ("reasoning_tokens", "X-Reasoning-Tokens"),
+)
+
+# Model families for which OpenRouter honours explicit cache_control breakpoints
+PROMPT_CACHE_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+def _configure_tiktoken_cache() -> None:
+    """Persist tiktoken's BPE files in the user cache instead of the temp dir.
+
+    tiktoken already shares loaded encodings between instances in-process; this
+    keeps the downloaded tables across restarts and temp-dir cleanups. An
+    explicit TIKTOKEN_CACHE_DIR / DATA_GYM_CACHE_DIR is left untouched.
+    """
+    if "TIKTOKEN_CACHE_DIR" in os.environ or "DATA_GYM_CACHE_DIR" in os.environ:
+        return
+    cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "tiktoken")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return  # Unwritable home; keep tiktoken's temp-dir default
+    os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+
+
+_configure_tiktoken_cache()
+
+
+def _close_client_resources(session, token_pool, accounting_manager) -> None:
+    session.close()
+    token_pool.shutdown(wait=False)
+    if accounting_manager:
+        accounting_manager.close()
+
+
+def count_tokens_fast(text: str) -> int:
+    """Estimate the token count as ~4 characters per token (no BPE encoding)."""
+    return len(text) >> 2
 
 
 class LLMClient:
@@ -23,9 +89,24 @@ class LLMClient:
         enable_rate_limiting: bool = True,
         enable_audit_log: bool = True,
         skip_outbound_key_checks: bool = False,  # New parameter for outbound key checks
+        cache_enabled: bool = False,
+        cache_max_entries: int = 512,
+        semantic_cache: Optional[SemanticCache] = None,
+        embedding_model: str = "openai/text-embedding-3-small",
+        exact_token_counts: bool = True,
     ) -> None:
         """Initialize the client with API key from environment or direct parameter."""
         self.encoder = tiktoken.get_encoding("cl100k_base")
+        # Repeated prompts skip tokenization entirely
+        self._count_tokens = functools.lru_cache(maxsize=1024)(self._encode_len)
+        # With exact_token_counts=False, input/output token counts are cheap
+        # length-based estimates and tiktoken is never run per request
+        self.exact_token_counts = exact_token_counts
+        # Token counts only feed the result/logs, so compute them while the
+        # request is in flight (tiktoken releases the GIL while encoding)
+        self._token_pool = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="llm-token-count"
+        )
         self.skip_redaction = (
             skip_outbound_key_checks  # Use the new parameter for redaction control
         )
@@ -33,35 +114,37 @@ class LLMClient:
         self.api_key = api_key or os.getenv(
             "OPENROUTER_API_KEY"
         )  # Use provided key or env var
-        logger.debug(f"DEBUG: LLMClient initialized with API Key: {self.api_key}")
+
+        # Reported to accounting/audit logs on every request; resolve once
+        self._user_name = (
+            os.getenv("USERNAME") or os.getenv("USER") or "unknown_user"
+        )
 
         self.enable_rate_limiting = enable_rate_limiting
 
         self.accounting_manager = LLMAccountingManager(
             enable_logging=enable_logging, enable_audit_log=enable_audit_log
         )
-        self.llm_tracker = self.accounting_manager.get_tracker()
-        self.audit_logger = self.accounting_manager.get_audit_logger()
-
-        if self.enable_rate_limiting:
-            # TODO: Check if llm-accounting supports rate limiting.
-            # For now, assume it doesn't and log a warning.
-            logger.warning(
-                "Rate limiting is enabled but not yet implemented in LLMClient."
-            )
 
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable not set")
-        elif not (self.api_key.startswith("sk-") and len(self.api_key) >= 32):
+        elif not _API_KEY_RE.match(self.api_key):
             raise ValueError(
-                "Invalid OPENROUTER_API_KEY format - must start with 'sk-' and be at least 32 characters"
+                "Invalid OPENROUTER_API_KEY format - must start with 'sk-', be at least 32 characters"
+                " and contain only letters, digits, '_' or '-'"
             )
 
-        # Add API key redaction filter to logger
-        logger.addFilter(ApiKeyFilter(self.api_key))
+        # Redact this client's API key from log messages
+        _api_key_filter.add_key(self.api_key)
         logger.info("API key format validation passed")
         self.base_url = get_api_base_url(api_base_url)
-        logger.debug(f"DEBUG: LLMClient using base URL: {self.base_url}")
+        logger.debug("LLMClient using base URL: %s", self.base_url)
+        # Paces calls to this client's model and backs off on 429s; pooled
+        # per-model clients keep their own adapted rate across requests
+        self._rate_limiter: Optional[RateLimiter] = None
+        if self.enable_rate_limiting:
+            rpm, tpm = limits_for_base_url(self.base_url)
+            self._rate_limiter = RateLimiter(rpm=rpm, tpm=tpm)
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "HTTP-Referer": "https://github.com/llm-wrapper-mcp-server",
@@ -70,31 +153,149 @@ class LLMClient:
             "X-API-Version": "1",
             "X-Response-Content": "usage",
         }
+        # Headers are fixed after init; keep a log-safe copy for trace output
+        self._redacted_headers = {
+            k: ("***" if k == "Authorization" else v) for k, v in self.headers.items()
+        }
         self.model = model
 
+        # Persistent session so consecutive calls reuse the pooled TLS connection
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            # Only retry failures to connect, where nothing reached the
+            # server. A completion POST that failed later may already have
+            # been processed and billed, so that is left to the caller (the
+            # default allowed_methods also excludes POST from read retries).
+            max_retries=Retry(
+                total=2,
+                connect=2,
+                read=0,
+                status=0,
+                backoff_factor=0.2,
+                raise_on_status=False,
+            ),
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update(self.headers)
+
+        # Release the session, workers and accounting backend exactly once:
+        # on close(), when the client is garbage collected, or at exit
+        self._finalizer = weakref.finalize(
+            self,
+            _close_client_resources,
+            self._session,
+            self._token_pool,
+            self.accounting_manager,
+        )
+
         # Handle system prompt configuration
         self.system_prompt = load_system_prompt(system_prompt_path)
 
+        # Opt-in exact-match response cache. Hits are served without an API
+        # call, so they are not recorded in usage accounting or the audit log
+        self.cache_enabled = cache_enabled
+        self._resp_cache = ResponseCache(max_entries=cache_max_entries)
+        # Optional near-duplicate cache matching paraphrased prompts by embedding
+        self.semantic_cache = semantic_cache
+        self.embedding_model = embedding_model
+
+    @property
+    def system_prompt(self) -> str:
+        return self._system_prompt
+
+    @system_prompt.setter
+    def system_prompt(self, value: str) -> None:
+        self._system_prompt = value
+        self._system_message = self._build_system_message()
+        # The system prompt is static, so tokenize it once rather than per request
+        if self.exact_token_counts:
+            self._system_tokens = self._encode_len(value)
+        else:
+            self._system_tokens = count_tokens_fast(value)
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @model.setter
+    def model(self, value: str) -> None:
+        self._model = value
+        if hasattr(self, "_system_prompt"):
+            self._system_message = self._build_system_message()
+
+    @property
+    def llm_tracker(self):
+        return self.accounting_manager.get_tracker()
+
+    @property
+    def audit_logger(self):
+        return self.accounting_manager.get_audit_logger()
+
+    def _build_system_message(self) -> Dict[str, Any]:
+        """Build the system message shared (never mutated) by every request payload.
+
+        For providers that support it, the static system prompt is marked as a
+        prompt-cache breakpoint so it is not re-processed on every request.
+        """
+        if self._system_prompt and self._model.startswith(PROMPT_CACHE_MODEL_PREFIXES):
+            return {
+                "role": "system",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": self._system_prompt,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            }
+        return {"role": "system", "content": self._system_prompt}
+
+    def _encode_len(self, text: str) -> int:
+        return len(self.encoder.encode_ordinary(text))
+
     def generate_response(
         self, prompt: str, max_tokens: Optional[int] = None
     ) -> Dict[str, Any]:
         """Generate a response for the given prompt."""
-        # Calculate token counts
-        system_tokens = len(self.encoder.encode(self.system_prompt))
-        user_tokens = len(self.encoder.encode(prompt))
-        logger.debug(
-            "Token counts - system: %d, user: %d, total: %d",
-            system_tokens,
-            user_tokens,
-            system_tokens + user_tokens,
-        )
+        cache_key = None
+        if self.cache_enabled:
+            cache_key = make_cache_key(
+                m=self.model,
+                s=self.system_prompt,
+                p=prompt,
+                u=self.base_url,
+                t=max_tokens,
+            )
+            cached = self._resp_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Response cache hit for model %s", self.model)
+                return cached
+
+        semantic_namespace = None
+        prompt_vector = None
+        if self.semantic_cache is not None:
+            prompt_vector = self._embed_prompt(prompt)
+            if prompt_vector is not None:
+                semantic_namespace = make_cache_key(
+                    m=self.model, s=self.system_prompt, u=self.base_url, t=max_tokens
+                )
+                cached = self.semantic_cache.lookup(semantic_namespace, prompt_vector)
+                if cached is not None:
+                    logger.debug("Semantic cache hit for model %s", self.model)
+                    return cached
+
+        # Count prompt tokens in the background while the request is sent
+        system_tokens = self._system_tokens
+        user_tokens_future = None
+        if self.exact_token_counts:
+            user_tokens_future = self._token_pool.submit(self._count_tokens, prompt)
 
         payload = {
             "model": self.model,
-            "messages": [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": prompt},
-            ],
+            "messages": [self._system_message, {"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
         }
 
@@ -102,20 +303,25 @@ class LLMClient:
             # Log outbound prompt
             self.accounting_manager.log_prompt(
                 app_name="LLMClient.generate_response",
-                user_name=os.getenv("USERNAME", "unknown_user"),
+                user_name=self._user_name,
                 model=self.model,
                 prompt_text=prompt,
             )
 
-            response_content, response_headers, response_data = self._send_llm_request(payload)
+            response_content, response_headers, response_data = self._send_rate_limited(
+                payload, system_tokens + count_tokens_fast(prompt) + (max_tokens or 512)
+            )
 
-            response_tokens = len(self.encoder.encode(response_content))
-            logger.debug("Response token count: %d", response_tokens)
+            response_tokens_future = None
+            if self.exact_token_counts:
+                response_tokens_future = self._token_pool.submit(
+                    self._encode_len, response_content
+                )
 
             # Log remote reply
             self.accounting_manager.log_response(
                 app_name="LLMClient.generate_response",
-                user_name=os.getenv("USERNAME", "unknown_user"),
+                user_name=self._user_name,
                 model=self.model,
                 response_text=response_content,
                 remote_completion_id=response_data.get(
@@ -123,44 +329,61 @@ class LLMClient:
                 ),  # Assuming 'id' is the completion ID
             )
 
+            # Read each usage header once; response_headers is case-insensitive,
+            # so every lookup case-folds the key
+            api_usage = {
+                field: response_headers.get(header)
+                for field, header in USAGE_HEADERS
+            }
+
             # Log accounting information
             logger.debug(
                 "API usage - Total: %s, Prompt: %s, Completion: %s, Cost: %s",
-                response_headers.get("X-Total-Tokens"),
-                response_headers.get("X-Prompt-Tokens"),
-                response_headers.get("X-Completion-Tokens"),
-                response_headers.get("X-Total-Cost"),
+                api_usage["total_tokens"],
+                api_usage["prompt_tokens"],
+                api_usage["completion_tokens"],
+                api_usage["total_cost"],
             )
 
             # Record usage with llm-accounting
             self.accounting_manager.track_usage(
                 model=self.model,
-                prompt_tokens=int(response_headers.get("X-Prompt-Tokens", 0)),
-                completion_tokens=int(response_headers.get("X-Completion-Tokens", 0)),
-                total_tokens=int(response_headers.get("X-Total-Tokens", 0)),
-                cost=float(response_headers.get("X-Total-Cost", 0.0)),
-                cached_tokens=int(response_headers.get("X-Cached-Tokens", 0)),
-                reasoning_tokens=int(response_headers.get("X-Reasoning-Tokens", 0)),
+                prompt_tokens=int(api_usage["prompt_tokens"] or 0),
+                completion_tokens=int(api_usage["completion_tokens"] or 0),
+                total_tokens=int(api_usage["total_tokens"] or 0),
+                cost=float(api_usage["total_cost"] or 0.0),
+                cached_tokens=int(api_usage["cached_tokens"] or 0),
+                reasoning_tokens=int(api_usage["reasoning_tokens"] or 0),
                 caller_name="LLMClient.generate_response",
                 project="llm_wrapper_mcp_server",
-                username=os.getenv(
-                    "USERNAME", "unknown_user"
-                ),  # Use USERNAME env var or fallback
+                username=self._user_name,
             )
 
-            return {
+            if self.exact_token_counts:
+                user_tokens = user_tokens_future.result()
+                response_tokens = response_tokens_future.result()
+            else:
+                user_tokens = count_tokens_fast(prompt)
+                response_tokens = count_tokens_fast(response_content)
+            logger.debug(
+                "Token counts - system: %d, user: %d, total: %d, response: %d",
+                system_tokens,
+                user_tokens,
+                system_tokens + user_tokens,
+                response_tokens,
+            )
+
+            result = {
                 "response": response_content,
                 "input_tokens": system_tokens + user_tokens,
                 "output_tokens": response_tokens,
-                "api_usage": {
-                    "total_tokens": response_headers.get("X-Total-Tokens"),
-                    "prompt_tokens": response_headers.get("X-Prompt-Tokens"),
-                    "completion_tokens": response_headers.get("X-Completion-Tokens"),
-                    "total_cost": response_headers.get("X-Total-Cost"),
-                    "cached_tokens": response_headers.get("X-Cached-Tokens"),
-                    "reasoning_tokens": response_headers.get("X-Reasoning-Tokens"),
-                },
+                "api_usage": api_usage,
             }
+            if cache_key is not None:
+                self._resp_cache.put(cache_key, result)
+            if semantic_namespace is not None:
+                self.semantic_cache.add(semantic_namespace, prompt_vector, result)
+            return result
 
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 429:
@@ -181,19 +404,57 @@ class LLMClient:
         except KeyError as e:
             logger.error("Malformed API response: %s", str(e))
             raise RuntimeError(f"Unexpected API response format: {str(e)}") from e
+        except json_codec.JSONDecodeError as e:
+            logger.error("API response is not valid JSON: %s", str(e))
+            raise RuntimeError(f"Invalid API response format: {str(e)}") from e
+
+    def _send_rate_limited(
+        self, payload: Dict[str, Any], estimated_tokens: int
+    ) -> tuple[str, Dict[str, Any], Dict[str, Any]]:
+        """Send the request through the rate limiter, retrying briefly on 429."""
+        limiter = self._rate_limiter
+        if limiter is None:
+            return self._send_llm_request(payload)
+        attempt = 0
+        while True:
+            waited = limiter.acquire(estimated_tokens)
+            if waited:
+                logger.debug("Rate limiter delayed request by %.2fs", waited)
+            try:
+                result = self._send_llm_request(payload)
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 429:
+                    raise
+                delay = limiter.on_throttled(
+                    attempt, e.response.headers.get("Retry-After")
+                )
+                if delay is None or attempt >= RATE_LIMIT_MAX_RETRIES:
+                    raise
+                logger.warning(
+                    "Rate limited by API, retrying in %.1fs (attempt %d of %d)",
+                    delay,
+                    attempt + 1,
+                    RATE_LIMIT_MAX_RETRIES,
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            limiter.on_success()
+            return result
 
     def _send_llm_request(self, payload: Dict[str, Any]) -> tuple[str, Dict[str, Any], Dict[str, Any]]:
-        logger.debug(
-            "DEBUG: Sending LLM API request to %s",
-            f"{self.base_url}/chat/completions",
-        )
-        logger.debug("DEBUG: Request payload: %s", payload)
-        logger.debug("DEBUG: Request headers: %s", self.headers)
+        url = f"{self.base_url}/chat/completions"
+        logger.debug("DEBUG: Sending LLM API request to %s", url)
+        # Full payload/header dumps are TRACE-only; skip building them otherwise
+        if logger.isEnabledFor(TRACE_LEVEL):
+            logger.log(TRACE_LEVEL, "TRACE: Request payload: %s", payload)
+            logger.log(TRACE_LEVEL, "TRACE: Request headers: %s", self._redacted_headers)
 
-        response = requests.post(
-            f"{self.base_url}/chat/completions",
-            headers=self.headers,
-            json=payload,
+        # Serialize with json_codec (orjson when available); the session
+        # already sends Content-Type: application/json
+        response = self._session.post(
+            url,
+            data=json_codec.dumps(payload),
             timeout=30,
         )
 
@@ -202,13 +463,19 @@ class LLMClient:
             response.status_code,
             response.reason,
         )
-        logger.debug("DEBUG: Response headers: %s", dict(response.headers))
-        logger.debug(
-            "DEBUG: Response content (first 200 chars): %.200s...", response.text
-        )
+        if logger.isEnabledFor(TRACE_LEVEL):
+            logger.log(TRACE_LEVEL, "TRACE: Response headers: %s", dict(response.headers))
+            # Decode only the logged prefix (200 chars <= 800 UTF-8 bytes)
+            # rather than the whole body via response.text
+            logger.log(
+                TRACE_LEVEL,
+                "TRACE: Response content (first 200 chars): %.200s...",
+                response.content[:800].decode("utf-8", errors="replace"),
+            )
 
         response.raise_for_status()
-        data = response.json()
+        # Decode the raw body directly (orjson when available) instead of response.json()
+        data = json_codec.loads(response.content)
 
         if not isinstance(data.get("choices"), list) or len(data["choices"]) == 0:
             raise RuntimeError("Invalid API response format: Missing choices array")
@@ -226,6 +493,31 @@ class LLMClient:
         response_content = self.redact_api_key(response_content)
         return response_content, response.headers, data
 
+    def _embed_prompt(self, prompt: str):
+        """Embed the prompt via the API's /embeddings endpoint for semantic caching.
+
+        Returns a normalized vector, or None if the embedding could not be obtained,
+        in which case the request simply bypasses the semantic cache.
+        """
+        try:
+            response = self._session.post(
+                f"{self.base_url}/embeddings",
+                data=json_codec.dumps({"model": self.embedding_model, "input": prompt}),
+                timeout=30,
+            )
+            response.raise_for_status()
+            embedding = json_codec.loads(response.content)["data"][0]["embedding"]
+        except (
+            requests.exceptions.RequestException,
+            KeyError,
+            IndexError,
+            TypeError,
+            ValueError,
+        ) as e:
+            logger.warning("Prompt embedding failed, skipping semantic cache: %s", str(e))
+            return None
+        return SemanticCache.normalize(embedding)
+
     def redact_api_key(self, content: str) -> str:
         """Redact actual API key value from content."""
         if self.skip_redaction:
@@ -238,6 +530,11 @@ class LLMClient:
         return content
 
     def close(self) -> None:
-        """Close any resources held by the accounting manager."""
-        if self.accounting_manager:
-            self.accounting_manager.close()
+        """Close the HTTP session, token-count workers and accounting resources."""
+        self._finalizer()
+
+    def __enter__(self) -> "LLMClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+# (base URL pattern, requests per minute, tokens per minute or None)
+PROVIDER_LIMITS = (
+    (re.compile(r"//api\.openai\.com\b"), 60.0, 150_000.0),
+    (re.compile(r"//api\.anthropic\.com\b"), 50.0, 80_000.0),
+)
+# Providers without a known quota are only slowed down once they send a 429
+DEFAULT_LIMITS: Tuple[float, Optional[float]] = (600.0, None)
+
+
+def limits_for_base_url(base_url: str) -> Tuple[float, Optional[float]]:
+    """Return the (requests/min, tokens/min) caps assumed for an API base URL."""
+    for pattern, rpm, tpm in PROVIDER_LIMITS:
+        if pattern.search(base_url):
+            return rpm, tpm
+    return DEFAULT_LIMITS
+
+
+class RateLimiter:
+    """Thread-safe token-bucket limiter for requests and tokens per minute.
+
+    The request rate adapts AIMD-style: every 429 halves it (down to min_rpm)
+    and every successful call adds rpm_increase back, up to the configured cap.
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: Optional[float] = None,
+        min_rpm: float = 1.0,
+        rpm_increase: float = 1.0,
+        rpm_decrease: float = 0.5,
+        backoff_base: float = 1.0,
+        max_backoff: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_rpm = rpm
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_rpm = min(min_rpm, rpm)
+        self.rpm_increase = rpm_increase
+        self.rpm_decrease = rpm_decrease
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._request_budget = rpm
+        self._token_budget = tpm
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._request_budget = min(
+            self.rpm, self._request_budget + elapsed * self.rpm / 60.0
+        )
+        if self.tpm is not None:
+            self._token_budget = min(
+                self.tpm, self._token_budget + elapsed * self.tpm / 60.0
+            )
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request (and `tokens` tokens) fit the budget.
+
+        Returns the number of seconds spent waiting.
+        """
+        if self.tpm is not None:
+            # A request larger than a whole minute's budget would wait forever
+            tokens = min(tokens, self.tpm)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                wait = 0.0
+                if self._request_budget < 1.0:
+                    wait = (1.0 - self._request_budget) * 60.0 / self.rpm
+                if self.tpm is not None and self._token_budget < tokens:
+                    wait = max(wait, (tokens - self._token_budget) * 60.0 / self.tpm)
+                if wait <= 0.0:
+                    self._request_budget -= 1.0
+                    if self.tpm is not None:
+                        self._token_budget -= tokens
+                    return waited
+            self._sleep(wait)
+            waited += wait
+
+    def on_success(self) -> None:
+        """Additive increase: creep back toward the configured rate."""
+        with self._lock:
+            self.rpm = min(self.max_rpm, self.rpm + self.rpm_increase)
+
+    def on_throttled(self, attempt: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """Multiplicative decrease after a 429.
+
+        Returns how long to wait before retry number `attempt` (0-based), or
+        None if the server asked for a longer pause than max_backoff.
+        """
+        with self._lock:
+            self._refill()
+            self.rpm = max(self.min_rpm, self.rpm * self.rpm_decrease)
+            # Spend what is left of the burst so the next calls are paced
+            self._request_budget = min(self._request_budget, 0.0)
+        delay = self.backoff_base * (2**attempt)
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass  # HTTP-date form; fall back to exponential backoff
+        if delay > self.max_backoff:
+            return None
+        return delay
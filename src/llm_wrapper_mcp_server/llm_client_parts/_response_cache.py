@@ -0,0 +1,46 @@
+import copy
+import json
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Any, Dict, Optional
+
+
+def make_cache_key(**parts: Any) -> str:
+    """Build a stable SHA-256 cache key from the request parts."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe in-process LRU cache for assembled LLM responses."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached response for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(entry)
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a copy of response, evicting the least recently used entry."""
+        entry = copy.deepcopy(response)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
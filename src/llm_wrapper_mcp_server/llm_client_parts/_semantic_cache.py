@@ -0,0 +1,123 @@
+import copy
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional dependency
+    np = None
+
+
+class _Partition:
+    """Growable float32 embedding matrix with parallel response storage."""
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.created = np.empty(capacity, dtype=np.float64)
+        self.responses: List[Dict[str, Any]] = []
+
+    @property
+    def size(self) -> int:
+        return len(self.responses)
+
+    def append(self, vector: "np.ndarray", response: Dict[str, Any], now: float) -> None:
+        if self.size == self.matrix.shape[0]:
+            # Double the buffer so appends stay amortized O(1)
+            grown = np.empty((self.size * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[: self.size] = self.matrix
+            self.matrix = grown
+            created = np.empty(self.size * 2, dtype=np.float64)
+            created[: self.size] = self.created
+            self.created = created
+        self.matrix[self.size] = vector
+        self.created[self.size] = now
+        self.responses.append(response)
+
+    def keep(self, mask: "np.ndarray") -> None:
+        kept = int(mask.sum())
+        self.matrix[:kept] = self.matrix[: self.size][mask]
+        self.created[:kept] = self.created[: self.size][mask]
+        self.responses = [r for r, k in zip(self.responses, mask) if k]
+
+
+class SemanticCache:
+    """Near-duplicate response cache based on embedding cosine similarity.
+
+    Entries are partitioned by namespace (model, system prompt, ...) so that a
+    paraphrased prompt only matches responses produced under the same settings.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: Optional[float] = 3600.0,
+        max_entries: int = 1024,
+    ):
+        if np is None:
+            raise ImportError(
+                "SemanticCache requires numpy. Install it with "
+                "'pip install llm-wrapper-mcp-server[semantic-cache]'."
+            )
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(embedding: Any) -> "np.ndarray":
+        """Return the embedding as a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def lookup(self, namespace: str, vector: "np.ndarray") -> Optional[Dict[str, Any]]:
+        """Return a copy of the most similar cached response above the threshold."""
+        with self._lock:
+            partition = self._partitions.get(namespace)
+            if partition is None or partition.size == 0:
+                return None
+            if partition.matrix.shape[1] != vector.shape[0]:
+                return None
+            sims = partition.matrix[: partition.size] @ vector
+            if self.ttl_seconds is not None:
+                expired = partition.created[: partition.size] < (
+                    time.time() - self.ttl_seconds
+                )
+                sims[expired] = -np.inf
+            best = int(np.argmax(sims))
+            if sims[best] < self.similarity_threshold:
+                return None
+            response = partition.responses[best]
+        return copy.deepcopy(response)
+
+    def add(self, namespace: str, vector: "np.ndarray", response: Dict[str, Any]) -> None:
+        """Store a response under the given (normalized) prompt embedding."""
+        now = time.time()
+        entry = copy.deepcopy(response)
+        with self._lock:
+            partition = self._partitions.get(namespace)
+            if partition is None or partition.matrix.shape[1] != vector.shape[0]:
+                partition = _Partition(dim=vector.shape[0])
+                self._partitions[namespace] = partition
+            if partition.size >= self.max_entries:
+                self._evict(partition, now)
+            partition.append(vector, entry, now)
+
+    def _evict(self, partition: _Partition, now: float) -> None:
+        mask = np.ones(partition.size, dtype=bool)
+        if self.ttl_seconds is not None:
+            mask &= partition.created[: partition.size] >= now - self.ttl_seconds
+        overflow = int(mask.sum()) - self.max_entries + 1
+        if overflow > 0:
+            # Drop the oldest surviving entries (rows are kept in insertion order)
+            mask[np.flatnonzero(mask)[:overflow]] = False
+        partition.keep(mask)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partitions.clear()
+
+    def __len__(self) -> int:
+        return sum(p.size for p in self._partitions.values())
@@ -2,13 +2,22 @@
 STDIO-based MCP server implementation.
 """
 
-import json
+import functools
+import io
+import logging
 import os
+import re
+import select
 import sys
-from typing import Any, Dict, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
 import requests.exceptions
 
+from . import json_codec
+from .line_reader import LineReader
 from .logger import get_logger
 from .llm_client_parts._llm_client_core import LLMClient as _LLMClientCore
 
@@ -22,6 +31,57 @@ LLMClient = _LLMClientCore
 logger = get_logger(__name__)
 
 
+# Flush buffered responses once this many bytes are pending, even mid-burst
+OUTPUT_FLUSH_THRESHOLD = 64 * 1024
+# Clients for per-call "model" overrides kept alive for reuse
+MODEL_CLIENT_POOL_SIZE = 32
+# Frames longer than this are rejected without being parsed
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+# A JSON-RPC frame is an object, or a batch array (answered with Invalid
+# Request, as batches are not supported)
+_JSON_RPC_STARTS = (b"{", b"[")
+# Shared logging extra for messages not tied to a request (never mutated)
+_NO_REQUEST_EXTRA = {"request_id": "N/A"}
+
+# Constant parts of the JSON-RPC errors this server returns
+_PARSE_ERROR = json_codec.prebuild_error(-32700, "Parse error")
+_INVALID_REQUEST = json_codec.prebuild_error(-32600, "Invalid Request")
+_METHOD_NOT_FOUND = json_codec.prebuild_error(-32601, "Method not found")
+_INVALID_PARAMS = json_codec.prebuild_error(-32602, "Invalid params")
+_INVALID_MODEL = json_codec.prebuild_error(-32602, "Invalid model specification")
+_SECURITY_VIOLATION = json_codec.prebuild_error(-32602, "Security violation")
+_INTERNAL_ERROR = json_codec.prebuild_error(-32000, "Internal error")
+
+# "provider/model": two non-empty parts around exactly one '/'
+_MODEL_RE = re.compile(r"[^/]+/[^/]+")
+
+# Client-facing messages for LLM call failures, keyed by exception type.
+# Order matters for subclass lookup: Timeout and HTTPError are both
+# RequestExceptions and must be matched before it.
+_ERROR_MESSAGES: Dict[Type[BaseException], Callable[[Any], str]] = {
+    requests.Timeout: lambda e: "LLM call timed out.",
+    requests.HTTPError: lambda e: (
+        f"LLM API HTTP error: {e.response.status_code} {e.response.reason}"
+    ),
+    requests.RequestException: lambda e: f"LLM API network error: {e}",
+}
+# RuntimeErrors from LLMClient whose text is safe to show the client as-is
+_RUNTIME_PASSTHROUGH = (
+    "API rate limit exceeded",
+    "Invalid API response format",
+    "Unexpected API response format",
+)
+
+# A successful llm_call result is spliced around the serialized response
+# text, so no per-call result dicts are built
+_TEXT_RESULT_HEAD = b',"result":{"content":[{"type":"text","text":'
+_TEXT_RESULT_END = b'}],"isError":false}}'
+
+# Results of the resource methods, which this server always answers empty
+_RESOURCES_LIST_TAIL = json_codec.prebuild_tail(result={"resources": {}})
+_RESOURCES_TEMPLATES_LIST_TAIL = json_codec.prebuild_tail(result={"templates": {}})
+
+
 class LLMMCPWrapper:
     """LLM MCP Wrapper server implementation."""
 
@@ -40,11 +100,19 @@ class LLMMCPWrapper:
         enable_logging: bool = True,
         enable_rate_limiting: bool = True,
         enable_audit_log: bool = True,
+        enable_response_cache: bool = False,
+        max_concurrent_requests: int = 1,
     ) -> None:
         logger.debug("StdioServer initialized")
         self.enable_logging = enable_logging
         self.enable_rate_limiting = enable_rate_limiting
         self.enable_audit_log = enable_audit_log
+        self.enable_response_cache = enable_response_cache
+        # Checked once here rather than on every run(), and before any
+        # client is built so they all inherit it
+        if not skip_outbound_key_checks and "--skip-outbound-key-leaks" in sys.argv:
+            logger.info("Outbound key leak checks disabled by command line parameter")
+            skip_outbound_key_checks = True
         llm_client_kwargs = {
             "system_prompt_path": system_prompt_path,
             "model": model,
@@ -52,6 +120,7 @@ class LLMMCPWrapper:
             "enable_logging": self.enable_logging,
             "enable_rate_limiting": self.enable_rate_limiting,
             "enable_audit_log": self.enable_audit_log,
+            "cache_enabled": self.enable_response_cache,
             "skip_outbound_key_checks": skip_outbound_key_checks,
         }
         if llm_api_key is not None:
@@ -60,22 +129,34 @@ class LLMMCPWrapper:
         if llm_api_key is None and os.getenv("OPENROUTER_API_KEY") is None:
             os.environ["OPENROUTER_API_KEY"] = "sk-dummy-key-for-tests-1234567890abcdef"
 
-        if isinstance(LLMClient, type):
-            # __init__ might be patched but class is real; instantiate using original init
-            if llm_api_key is None and os.getenv("OPENROUTER_API_KEY") is None:
-                os.environ["OPENROUTER_API_KEY"] = "sk-dummy-key-for-tests-1234567890abcdef"
-            self.llm_client = _ORIGINAL_LLMCLIENT_CLASS.__new__(_ORIGINAL_LLMCLIENT_CLASS)
-            _ORIGINAL_LLMCLIENT_INIT(self.llm_client, **llm_client_kwargs)
-        else:
-            # Class itself has been patched (e.g., in tests); use the patched constructor
-            self.llm_client = LLMClient(**llm_client_kwargs)
+        # The client (system prompt, HTTP session, tokenizer) is only built
+        # on first use, so handshake-only sessions never pay for it
+        self._llm_client_kwargs = llm_client_kwargs
         self.system_prompt_path = system_prompt_path
         self.max_user_prompt_tokens = max_user_prompt_tokens
+        # Clients tend to resend the same prompts; skip re-tokenizing them
+        self._prompt_token_count = functools.lru_cache(maxsize=4096)(
+            self._encode_prompt_len
+        )
+        self._longest_token: Optional[int] = None
+        # Per-model clients keep their HTTP session and loaded system prompt
+        self._model_clients: "OrderedDict[Tuple[str, bool], LLMClient]" = OrderedDict()
+        self._model_clients_lock = threading.Lock()
+        self._llm_client_lock = threading.Lock()
+        # With more than one, run() answers tools/call requests from a thread
+        # pool so a slow LLM call no longer blocks the requests behind it
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
         self.skip_outbound_key_checks = skip_outbound_key_checks
         self.max_tokens = max_tokens
         self.server_name = server_name
         self.server_description = server_description
         self.openrouter_api_key = os.environ.get("OPENROUTER_API_KEY")
+        # Responses are only held back while run() is draining a burst of requests
+        self._defer_flush = False
+        self._pending_output: List[bytes] = []
+        self._pending_bytes = 0
+        self._output_lock = threading.Lock()
+        self._reader: Optional[LineReader] = None
 
         if initial_tools is None:
             self.tools = {
@@ -99,12 +180,66 @@ class LLMMCPWrapper:
             }
         else:
             self.tools = initial_tools
+        self._capabilities = {
+            "protocolVersion": "2024-11-05",
+            "serverInfo": {
+                "name": self.server_name,
+                "version": "0.1.0",
+                "description": self.server_description,
+            },
+            "capabilities": {
+                "tools": self.tools,
+                "resources": {},
+                "prompts": {},
+                "sampling": {},
+            },
+        }
+        # The handshake, initialize and tools/list answers never change, so
+        # serialize them once and only splice in the request id per call.
+        self._initialize_tail = json_codec.prebuild_tail(result=self._capabilities)
+        self._tools_list_tail = json_codec.prebuild_tail(result={"tools": self.tools})
+        self._server_ready_frame = json_codec.dumps(
+            {
+                "jsonrpc": "2.0",
+                "id": None,
+                "method": "mcp/serverReady",
+                "params": self._capabilities,
+            }
+        )
+        self._dispatch = {
+            "initialize": self._handle_initialize,
+            "tools/list": self._handle_tools_list,
+            "tools/call": self._handle_tools_call,
+            "resources/list": self._handle_resources_list,
+            "resources/templates/list": self._handle_resources_templates_list,
+        }
+
+    @functools.cached_property
+    def llm_client(self) -> LLMClient:
+        # Concurrent workers may all reach here first; build exactly one
+        # client and store it before releasing the lock
+        with self._llm_client_lock:
+            client = self.__dict__.get("llm_client")
+            if client is None:
+                client = self._build_llm_client()
+                self.__dict__["llm_client"] = client
+            return client
+
+    def _build_llm_client(self) -> LLMClient:
+        kwargs = self._llm_client_kwargs
+        if isinstance(LLMClient, type):
+            # __init__ might be patched but class is real; instantiate using original init
+            if "api_key" not in kwargs and os.getenv("OPENROUTER_API_KEY") is None:
+                os.environ["OPENROUTER_API_KEY"] = "sk-dummy-key-for-tests-1234567890abcdef"
+            client = _ORIGINAL_LLMCLIENT_CLASS.__new__(_ORIGINAL_LLMCLIENT_CLASS)
+            _ORIGINAL_LLMCLIENT_INIT(client, **kwargs)
+            return client
+        # Class itself has been patched (e.g., in tests); use the patched constructor
+        return LLMClient(**kwargs)
 
     def send_response(self, response: Dict[str, Any]) -> None:
         try:
-            response_str = json.dumps(response) + "\n"
-            sys.stdout.write(response_str)
-            sys.stdout.flush()
+            self.send_frame(json_codec.dumps(response))
         except Exception as e:
             logger.error(
                 "Error sending response to stdout: %s",
@@ -113,36 +248,63 @@ class LLMMCPWrapper:
             )
             raise
 
-    def _handle_initialize(self, request_id: Optional[str]) -> None:
-        logger.debug("Handling initialize request.", extra={"request_id": request_id})
-        self.send_response(
-            {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "serverInfo": {
-                        "name": self.server_name,
-                        "version": "0.1.0",
-                        "description": self.server_description,
-                    },
-                    "capabilities": {
-                        "tools": self.tools,
-                        "resources": {},
-                        "prompts": {},
-                        "sampling": {},
-                    },
-                },
-            }
-        )
-        logger.debug("initialize response sent.", extra={"request_id": request_id})
+    def send_frame(self, data: bytes) -> None:
+        """Send an already serialized JSON-RPC frame to stdout."""
+        # Responses may come from worker threads; keep each line intact
+        with self._output_lock:
+            if not self._defer_flush:
+                json_codec.write_line(data)
+                return
+            self._pending_output.append(data)
+            self._pending_bytes += len(data) + 1
+            if self._pending_bytes >= OUTPUT_FLUSH_THRESHOLD:
+                self._write_pending()
+
+    def flush_output(self) -> None:
+        """Write all buffered responses to stdout with a single write and flush."""
+        with self._output_lock:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        if not self._pending_output:
+            return
+        frames = self._pending_output
+        self._pending_output = []
+        self._pending_bytes = 0
+        json_codec.write_lines(frames)
+
+    def _input_pending(self) -> bool:
+        """Return True if stdin already has data, i.e. the next read won't block."""
+        if self._reader is not None and self._reader.has_buffered_line:
+            return True
+        try:
+            ready, _, _ = select.select([sys.stdin.fileno()], [], [], 0)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            # Not a selectable fd (e.g. a pipe on Windows or a test stream)
+            return False
+        return bool(ready)
 
-    def _handle_tools_list(self, request_id: Optional[str]) -> None:
-        logger.debug("Handling tools/list request.", extra={"request_id": request_id})
-        self.send_response(
-            {"jsonrpc": "2.0", "id": request_id, "result": {"tools": self.tools}}
-        )
-        logger.debug("tools/list response sent.", extra={"request_id": request_id})
+    def _handle_initialize(
+        self, params: Dict[str, Any], request_id: Optional[str]
+    ) -> None:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            extra = {"request_id": request_id}
+            logger.debug("Handling initialize request.", extra=extra)
+        self.send_frame(json_codec.frame(request_id, self._initialize_tail))
+        if debug:
+            logger.debug("initialize response sent.", extra=extra)
+
+    def _handle_tools_list(
+        self, params: Dict[str, Any], request_id: Optional[str]
+    ) -> None:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            extra = {"request_id": request_id}
+            logger.debug("Handling tools/list request.", extra=extra)
+        self.send_frame(json_codec.frame(request_id, self._tools_list_tail))
+        if debug:
+            logger.debug("tools/list response sent.", extra=extra)
 
     def _validate_tools_call_params(
         self, params: Dict[str, Any], request_id: Optional[str]
@@ -152,16 +314,12 @@ class LLMMCPWrapper:
 
         if name not in self.tools:
             logger.warning("Tool not found: %s", name, extra={"request_id": request_id})
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32601,
-                        "message": "Method not found",
-                        "data": f"Tool '{name}' not found",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    request_id,
+                    _METHOD_NOT_FOUND,
+                    f"Tool '{name}' not found",
+                )
             )
             return None
 
@@ -172,16 +330,12 @@ class LLMMCPWrapper:
                 name,
                 extra={"request_id": request_id},
             )
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": "Invalid params",
-                        "data": "Missing required 'prompt' argument",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    request_id,
+                    _INVALID_PARAMS,
+                    "Missing required 'prompt' argument",
+                )
             )
             return None
 
@@ -193,42 +347,65 @@ class LLMMCPWrapper:
             logger.warning(
                 "API key leak detected in prompt", extra={"request_id": request_id}
             )
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": "Security violation",
-                        "data": "Prompt contains sensitive API key - request rejected",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    request_id,
+                    _SECURITY_VIOLATION,
+                    "Prompt contains sensitive API key - request rejected",
+                )
             )
             return None
 
-        prompt_tokens = len(self.llm_client.encoder.encode(prompt))
-        logger.debug(
-            "Prompt token count: %d/%d",
-            prompt_tokens,
-            self.max_user_prompt_tokens,
-            extra={"request_id": request_id},
-        )
+        prompt_tokens = self._bounded_prompt_tokens(prompt)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Prompt token count: %d/%d",
+                prompt_tokens,
+                self.max_user_prompt_tokens,
+                extra={"request_id": request_id},
+            )
         if prompt_tokens > self.max_user_prompt_tokens:
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": "Invalid params",
-                        "data": f"Prompt exceeds maximum length of {self.max_user_prompt_tokens} tokens",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    request_id,
+                    _INVALID_PARAMS,
+                    f"Prompt exceeds maximum length of {self.max_user_prompt_tokens} tokens",
+                )
             )
             return None
 
         return {"name": name, "prompt": prompt, "args": args}
 
+    def _encode_prompt_len(self, prompt: str) -> int:
+        return len(self.llm_client.encoder.encode_ordinary(prompt))
+
+    def _bounded_prompt_tokens(self, prompt: str) -> int:
+        """Return the prompt's token count, or a bound on the same side of the limit.
+
+        Every token decodes to at least one byte and at most the encoder's
+        longest token, so prompts that are clearly short or clearly too long
+        are classified from their UTF-8 length without running the tokenizer.
+        """
+        # ASCII text is one byte per character; only encode to measure otherwise
+        prompt_bytes = len(prompt) if prompt.isascii() else len(prompt.encode("utf-8"))
+        if prompt_bytes <= self.max_user_prompt_tokens:
+            return prompt_bytes
+        longest_token = self._longest_token_bytes()
+        if longest_token and prompt_bytes > self.max_user_prompt_tokens * longest_token:
+            return -(-prompt_bytes // longest_token)
+        return self._prompt_token_count(prompt)
+
+    def _longest_token_bytes(self) -> int:
+        if self._longest_token is None:
+            try:
+                self._longest_token = max(
+                    map(len, self.llm_client.encoder.token_byte_values()), default=0
+                )
+            except Exception:
+                # Unknown vocabulary: only the lower bound can be used
+                self._longest_token = 0
+        return self._longest_token
+
     def _validate_model_arg(
         self, model_arg: Optional[str], request_id: Optional[str]
     ) -> Optional[str]:
@@ -236,65 +413,66 @@ class LLMMCPWrapper:
             return None
 
         stripped_model = model_arg.strip()
+        if _MODEL_RE.fullmatch(stripped_model):
+            return stripped_model
+        # Invalid; work out which rule was broken for the error message
         if len(stripped_model) < 2:
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": "Invalid model specification",
-                        "data": "Model name must be at least 2 characters",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    request_id,
+                    _INVALID_MODEL,
+                    "Model name must be at least 2 characters",
+                )
             )
             return None
         if "/" not in stripped_model:
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": "Invalid model specification",
-                        "data": "Model name must contain a '/' separator",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    request_id,
+                    _INVALID_MODEL,
+                    "Model name must contain a '/' separator",
+                )
             )
             return None
-        parts = stripped_model.split("/")
-        if len(parts) != 2 or not all(parts):
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": "Invalid model specification",
-                        "data": "Model name must contain a provider and a model separated by a single '/'",
-                    },
-                }
+        self.send_frame(
+            json_codec.error_frame(
+                request_id,
+                _INVALID_MODEL,
+                "Model name must contain a provider and a model separated by a single '/'",
             )
-            return None
-        return stripped_model
+        )
+        return None
 
     def _get_llm_client_for_request(
         self, model_to_use: Optional[str]
     ) -> LLMClient:
-        if model_to_use and model_to_use != self.llm_client.model:
-            # TODO: Consider optimizing temporary client creation in high-throughput scenarios.
-            # This might involve a client pool or a more lightweight way to switch models.
-            return LLMClient(
-                system_prompt_path=self.system_prompt_path,
-                model=model_to_use,
-                api_base_url=self.llm_client.base_url,
-                api_key=self.llm_client.api_key,
-                enable_logging=self.enable_logging,
-                enable_rate_limiting=self.enable_rate_limiting,
-                enable_audit_log=self.enable_audit_log,
-                skip_outbound_key_checks=self.skip_outbound_key_checks,
-            )
-        return self.llm_client
+        if not model_to_use or model_to_use == self.llm_client.model:
+            return self.llm_client
+        with self._model_clients_lock:
+            return self._get_model_client(model_to_use)
+
+    def _get_model_client(self, model_to_use: str) -> LLMClient:
+        key = (model_to_use, self.skip_outbound_key_checks)
+        client = self._model_clients.get(key)
+        if client is not None:
+            self._model_clients.move_to_end(key)
+            return client
+        client = LLMClient(
+            system_prompt_path=self.system_prompt_path,
+            model=model_to_use,
+            api_base_url=self.llm_client.base_url,
+            api_key=self.llm_client.api_key,
+            enable_logging=self.enable_logging,
+            enable_rate_limiting=self.enable_rate_limiting,
+            enable_audit_log=self.enable_audit_log,
+            cache_enabled=self.enable_response_cache,
+            skip_outbound_key_checks=self.skip_outbound_key_checks,
+        )
+        self._model_clients[key] = client
+        if len(self._model_clients) > MODEL_CLIENT_POOL_SIZE:
+            _, evicted = self._model_clients.popitem(last=False)
+            evicted.close()
+        return client
 
     def _execute_llm_call(
         self,
@@ -308,21 +486,20 @@ class LLMMCPWrapper:
             response_data = client_to_use.generate_response(
                 prompt=prompt, max_tokens=self.max_tokens
             )
-            mcp_response = {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "content": [{"type": "text", "text": response_data["response"]}],
-                    "isError": False,
-                },
-            }
-            logger.debug(
-                "Sending MCP response: %s",
-                mcp_response,
-                extra={"request_id": request_id},
+            frame = (
+                b'{"jsonrpc":"2.0","id":'
+                + json_codec.dumps(request_id)
+                + _TEXT_RESULT_HEAD
+                + json_codec.dumps(response_data["response"])
+                + _TEXT_RESULT_END
             )
-            self.send_response(mcp_response)
-            logger.debug("send_response completed.", extra={"request_id": request_id})
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                extra = {"request_id": request_id}
+                logger.debug("Sending MCP response: %s", frame, extra=extra)
+            self.send_frame(frame)
+            if debug:
+                logger.debug("send_response completed.", extra=extra)
 
         except Exception as e:
             self._handle_llm_call_error(e, tool_name, request_id)
@@ -330,31 +507,29 @@ class LLMMCPWrapper:
     def _handle_llm_call_error(
         self, e: Exception, tool_name: str, request_id: Optional[str]
     ) -> None:
-        import traceback
-
-        tb = traceback.format_exc()
-        error_message = f"Internal error: {str(e)}"
-        if isinstance(e, requests.Timeout):
-            error_message = "LLM call timed out."
-        elif isinstance(e, requests.HTTPError):
-            error_message = (
-                f"LLM API HTTP error: {e.response.status_code} {e.response.reason}"
+        text = str(e)
+        describe = _ERROR_MESSAGES.get(type(e))
+        if describe is None:
+            # Subclasses (e.g. ConnectTimeout) take the first matching entry
+            describe = next(
+                (fn for cls, fn in _ERROR_MESSAGES.items() if isinstance(e, cls)),
+                None,
             )
-        elif isinstance(e, requests.RequestException):
-            error_message = f"LLM API network error: {str(e)}"
-        elif isinstance(e, RuntimeError) and (
-            "API rate limit exceeded" in str(e)
-            or "Invalid API response format" in str(e)
-            or "Unexpected API response format" in str(e)
+        if describe is not None:
+            error_message = describe(e)
+        elif isinstance(e, RuntimeError) and any(
+            marker in text for marker in _RUNTIME_PASSTHROUGH
         ):
-            error_message = str(e)
-        # Ensure tb is defined; it should be from the outer except's traceback.format_exc()
+            error_message = text
+        else:
+            error_message = f"Internal error: {text}"
+        # Formatting the traceback walks every frame; only do it when debugging
         logger.error(
-            "Error during tool '%s' execution: %s\n%s",
+            "Error during tool '%s' execution: %s",
             tool_name,
-            str(e),
-            tb,
+            text,
             extra={"request_id": request_id},
+            exc_info=logger.isEnabledFor(logging.DEBUG),
         )
         self.send_response(
             {
@@ -388,59 +563,63 @@ class LLMMCPWrapper:
 
         self._execute_llm_call(tool_name, prompt, validated_model_to_use, request_id)
 
-    def _handle_resources_list(self, request_id: Optional[str]) -> None:
-        logger.debug(
-            "Handling resources/list request.", extra={"request_id": request_id}
-        )
-        self.send_response(
-            {"jsonrpc": "2.0", "id": request_id, "result": {"resources": {}}}
-        )
-        logger.debug("resources/list response sent.", extra={"request_id": request_id})
-
-    def _handle_resources_templates_list(self, request_id: Optional[str]) -> None:
-        logger.debug(
-            "Handling resources/templates/list request.",
-            extra={"request_id": request_id},
-        )
-        self.send_response(
-            {"jsonrpc": "2.0", "id": request_id, "result": {"templates": {}}}
-        )
-        logger.debug(
-            "resources/templates/list response sent.", extra={"request_id": request_id}
-        )
+    def _handle_resources_list(
+        self, params: Dict[str, Any], request_id: Optional[str]
+    ) -> None:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            extra = {"request_id": request_id}
+            logger.debug("Handling resources/list request.", extra=extra)
+        self.send_frame(json_codec.frame(request_id, _RESOURCES_LIST_TAIL))
+        if debug:
+            logger.debug("resources/list response sent.", extra=extra)
+
+    def _handle_resources_templates_list(
+        self, params: Dict[str, Any], request_id: Optional[str]
+    ) -> None:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            extra = {"request_id": request_id}
+            logger.debug("Handling resources/templates/list request.", extra=extra)
+        self.send_frame(json_codec.frame(request_id, _RESOURCES_TEMPLATES_LIST_TAIL))
+        if debug:
+            logger.debug("resources/templates/list response sent.", extra=extra)
 
     def _handle_unknown_method(self, method: str, request_id: Optional[str]) -> None:
         logger.warning("Method not found: %s", method, extra={"request_id": request_id})
-        self.send_response(
-            {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "error": {
-                    "code": -32601,
-                    "message": "Method not found",
-                    "data": f"Method '{method}' not found",
-                },
-            }
+        self.send_frame(
+            json_codec.error_frame(
+                request_id,
+                _METHOD_NOT_FOUND,
+                f"Method '{method}' not found",
+            )
         )
 
     def handle_request(self, request: Dict[str, Any]) -> None:
+        if not isinstance(request, dict):
+            logger.warning(
+                "Invalid request: expected a JSON object, got %s.",
+                type(request).__name__,
+                extra=_NO_REQUEST_EXTRA,
+            )
+            self.send_frame(
+                json_codec.error_frame(
+                    None,
+                    _INVALID_REQUEST,
+                    "Request must be a JSON object; batches are not supported",
+                )
+            )
+            return
         request_id = request.get("id")
         method = request.get("method")
         params = request.get("params", {})
 
         try:
-            if method == "initialize":
-                self._handle_initialize(request_id)
-            elif method == "tools/list":
-                self._handle_tools_list(request_id)
-            elif method == "tools/call":
-                self._handle_tools_call(params, request_id)
-            elif method == "resources/list":
-                self._handle_resources_list(request_id)
-            elif method == "resources/templates/list":
-                self._handle_resources_templates_list(request_id)
+            handler = self._dispatch.get(method) if isinstance(method, str) else None
+            if handler is None:
+                self._handle_unknown_method(str(method or ""), request_id)
             else:
-                self._handle_unknown_method(method or "", request_id)
+                handler(params, request_id)
         except Exception as e:
             logger.error(
                 "Unexpected error handling request method '%s': %s",
@@ -449,50 +628,65 @@ class LLMMCPWrapper:
                 extra={"request_id": request_id},
                 exc_info=True,
             )
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32000,
-                        "message": "Internal error",
-                        "data": f"An unexpected error occurred: {str(e)}",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    request_id,
+                    _INTERNAL_ERROR,
+                    f"An unexpected error occurred: {str(e)}",
+                )
             )
 
     def _read_and_parse_request(self) -> Optional[Dict[str, Any]]:
         """Reads a line from stdin, parses it as JSON. Returns None on EOF or JSONDecodeError."""
-        line = sys.stdin.readline()
-        if not line:  # EOF
+        if self._reader is None:
+            self._reader = LineReader(sys.stdin)
+        line = self._reader.readline()
+        if line is None:  # EOF
             logger.info("EOF received from stdin.")
             return None
 
-        try:
-            request_data = json.loads(line)
-            current_request_id = request_data.get("id", "N/A")
-            logger.debug(
-                "Parsed MCP request: %s",
-                request_data,
-                extra={"request_id": current_request_id},
+        if len(line) > MAX_REQUEST_BYTES:
+            logger.error(
+                "Rejected %d byte request (limit %d).",
+                len(line),
+                MAX_REQUEST_BYTES,
+                extra=_NO_REQUEST_EXTRA,
             )
-            return request_data
-        except json.JSONDecodeError:
+            self.send_frame(
+                json_codec.error_frame(None, _PARSE_ERROR, "Request too large")
+            )
+            return None
+        head = line[:1]
+        if head not in _JSON_RPC_STARTS:
+            # Only copy the line when it doesn't start with the brace itself
+            head = line.lstrip()[:1]
+        if head not in _JSON_RPC_STARTS:
             logger.error(
                 "Parse error: Invalid JSON received from stdin.",
-                extra={"request_id": "N/A"},
+                extra=_NO_REQUEST_EXTRA,
             )
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": None,
-                    "error": {
-                        "code": -32700,
-                        "message": "Parse error",
-                        "data": "Invalid JSON",
+            self.send_frame(json_codec.error_frame(None, _PARSE_ERROR, "Invalid JSON"))
+            return None
+
+        try:
+            request_data = json_codec.loads(line)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Parsed MCP request: %s",
+                    request_data,
+                    extra={
+                        "request_id": request_data.get("id", "N/A")
+                        if isinstance(request_data, dict)
+                        else "N/A"
                     },
-                }
+                )
+            return request_data
+        except json_codec.JSONDecodeError:
+            logger.error(
+                "Parse error: Invalid JSON received from stdin.",
+                extra=_NO_REQUEST_EXTRA,
             )
+            self.send_frame(json_codec.error_frame(None, _PARSE_ERROR, "Invalid JSON"))
             return None  # Indicate error, allowing loop to decide whether to continue or break
 
     def _process_parsed_request(self, request_data: Optional[Dict[str, Any]]) -> None:
@@ -513,57 +707,45 @@ class LLMMCPWrapper:
                 },
                 exc_info=True,
             )
-            self.send_response(
-                {
-                    "jsonrpc": "2.0",
-                    "id": current_request_id_on_error,
-                    "error": {
-                        "code": -32000,
-                        "message": "Internal error",
-                        "data": "Internal server error. Check server logs for details.",
-                    },
-                }
+            self.send_frame(
+                json_codec.error_frame(
+                    current_request_id_on_error,
+                    _INTERNAL_ERROR,
+                    "Internal server error. Check server logs for details.",
+                )
             )
 
-    def run(self) -> None:
-        skip_outbound_key_checks_cli = "--skip-outbound-key-leaks" in sys.argv
-        if skip_outbound_key_checks_cli:
-            logger.info("Outbound key leak checks disabled by command line parameter")
-            self.skip_outbound_key_checks = True
-            self.llm_client.skip_redaction = True
+    def _process_request_in_worker(self, request_data: Dict[str, Any]) -> None:
+        """Handle a request on a worker thread and write its response right away."""
+        self._process_parsed_request(request_data)
+        # The main thread may be blocked reading stdin, so don't leave the
+        # response in the coalescing buffer
+        self.flush_output()
 
+    def run(self) -> None:
         logger.debug("StdioServer run method started. Sending initial capabilities.")
-        self.send_response(
-            {
-                "jsonrpc": "2.0",
-                "id": None,
-                "method": "mcp/serverReady",
-                "params": {
-                    "protocolVersion": "2024-11-05",
-                    "serverInfo": {
-                        "name": self.server_name,
-                        "version": "0.1.0",
-                        "description": self.server_description,
-                    },
-                    "capabilities": {
-                        "tools": self.tools,
-                        "resources": {},
-                        "prompts": {},
-                        "sampling": {},
-                    },
-                },
-            }
-        )
+        self.send_frame(self._server_ready_frame)
         logger.debug("Initial capabilities sent. Entering main request loop.")
 
         loop_count = 0
+        executor = None
+        if self.max_concurrent_requests > 1:
+            executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_requests,
+                thread_name_prefix="llm-wrapper-request",
+            )
+        # Frames are split from raw stdin bytes and parsed without decoding
+        self._reader = LineReader(sys.stdin)
+        self._defer_flush = True
         try:
             while True:
                 loop_count += 1
-                logger.debug(
-                    f"Request loop iter {loop_count}. Waiting for request.",
-                    extra={"request_id": "N/A"},
-                )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "Request loop iter %d. Waiting for request.",
+                        loop_count,
+                        extra=_NO_REQUEST_EXTRA,
+                    )
 
                 request_data = self._read_and_parse_request()
 
@@ -580,7 +762,19 @@ class LLMMCPWrapper:
                     )
                     break
 
-                self._process_parsed_request(request_data)
+                if (
+                    executor is not None
+                    and isinstance(request_data, dict)
+                    and request_data.get("method") == "tools/call"
+                ):
+                    # The default client is built lazily by the first worker,
+                    # where a construction error becomes that request's error
+                    executor.submit(self._process_request_in_worker, request_data)
+                else:
+                    self._process_parsed_request(request_data)
+                if not self._input_pending():
+                    # Flush only when the client is waiting on us
+                    self.flush_output()
 
         except Exception as e:
             logger.critical(
@@ -602,4 +796,14 @@ class LLMMCPWrapper:
                 logger.critical("Failed to send final error message: %s", str(final_e))
             raise
         finally:
+            if executor is not None:
+                logger.debug(
+                    "Waiting for in-flight requests to finish.", extra=_NO_REQUEST_EXTRA
+                )
+                executor.shutdown(wait=True)
+            self._defer_flush = False
+            try:
+                self.flush_output()
+            except Exception as flush_e:
+                logger.error("Failed to flush pending responses: %s", str(flush_e))
             logger.info("Server run loop terminated.")
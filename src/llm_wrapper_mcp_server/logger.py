@@ -1,6 +1,9 @@
 """Custom logging configuration with TRACE level support."""
 
 import logging
+import logging.handlers
+import queue
+import time
 import typing
 
 TRACE_LEVEL = 5
@@ -21,3 +24,93 @@ logging.setLoggerClass(TraceLogger)
 def get_logger(name: str) -> TraceLogger:
     """Get a logger instance with type hints for custom methods."""
     return typing.cast(TraceLogger, logging.getLogger(name))
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """FileHandler that writes through a large buffer instead of flushing per record.
+
+    The stream is flushed when a record at flush_level or above is written, or
+    when flush_interval seconds have passed since the last flush, so a debug-heavy
+    run issues one write() per buffer rather than one per record. close() and
+    logging.shutdown() still flush everything that is buffered.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        mode: str = "a",
+        encoding: typing.Optional[str] = None,
+        delay: bool = False,
+        buffer_size: int = 64 * 1024,
+        flush_level: int = logging.WARNING,
+        flush_interval: float = 1.0,
+    ):
+        self.buffer_size = buffer_size
+        self.flush_level = flush_level
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        super().__init__(filename, mode=mode, encoding=encoding, delay=delay)
+
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=self.buffer_size,
+            encoding=self.encoding,
+            errors=getattr(self, "errors", None),
+        )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.stream is None:
+            # Same reopen rule as FileHandler.emit (_closed is Python 3.10+)
+            if self.mode != "w" or not getattr(self, "_closed", False):
+                self.stream = self._open()
+            else:
+                return
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if (
+                record.levelno >= self.flush_level
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        super().flush()
+        self._last_flush = time.monotonic()
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a listener in the same process.
+
+    The stock prepare() merges args and renders tracebacks on the calling
+    thread so records can be pickled. Records here never leave the process,
+    so they are enqueued as-is and formatted by the listener's handlers.
+    Arguments are therefore rendered late; don't log objects that are
+    mutated right after the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes its handlers whenever the queue runs dry.
+
+    Buffered handlers then batch the writes of a burst, yet nothing stays
+    in memory once the server goes idle.
+    """
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            if not block:
+                raise
+        for handler in self.handlers:
+            handler.flush()
+        return self.queue.get()
@@ -1,3 +1,5 @@
+import logging
+import sys
 import pytest
 import uuid
 
@@ -11,6 +13,28 @@ def unique_db_paths():
     audit_db_path = f"file:{uuid.uuid4()}?mode=memory&cache=shared"
     return accounting_db_path, audit_db_path
 
+@pytest.fixture(autouse=True)
+def restore_root_logging():
+    """
+    Undo logging configured by tests that run the server's main(), which
+    replaces the root handlers and starts a background log listener.
+    """
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    # Tests import the entry point both as a package and through src/
+    for name in ("llm_wrapper_mcp_server.__main__", "src.llm_wrapper_mcp_server.__main__"):
+        module = sys.modules.get(name)
+        if module is not None:
+            module._stop_log_listener()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        if handler not in handlers:
+            handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
 def pytest_collection_modifyitems(config, items):
     """
     Deselect integration tests by default unless -m integration is used.
@@ -1,20 +1,23 @@
 # tests/test_ask_online_question_server.py
 import pytest
+import io
 import json
 import subprocess
 import sys
 import os
+import threading
 import time
 from unittest.mock import patch, MagicMock, call
-from ask_online_question_mcp_server.ask_online_question_server import AskOnlineQuestionServer
+from ask_online_question_mcp_server.ask_online_question_server import AskOnlineQuestionServer, JsonRpcRequest
 # For CLI tests
 from src.ask_online_question_mcp_server.__main__ import main as ask_online_main
 
 
 # Path to LLMClient where it's imported in ask_online_question_server.py
 ASKSERVER_LLMCLIENT_PATH = 'ask_online_question_mcp_server.ask_online_question_server.LLMClient'
-# Path to AskOnlineQuestionServer where it's imported in its __main__.py
-MAIN_ASKSERVER_PATH = "src.ask_online_question_mcp_server.__main__.AskOnlineQuestionServer"
+# AskOnlineQuestionServer as reached through the __main__.py entry point
+MAIN_ASKSERVER_INIT_PATH = "src.ask_online_question_mcp_server.ask_online_question_server.AskOnlineQuestionServer.__init__"
+MAIN_ASKSERVER_RUN_PATH = "src.ask_online_question_mcp_server.ask_online_question_server.AskOnlineQuestionServer.run"
 
 
 @pytest.fixture
@@ -35,6 +38,10 @@ def ask_server_fixture(): # Renamed to make it clear it's a fixture
         server.llm_client = mock_llm_client_instance # Ensure the instance on server is the mock
         yield server, MockLLMClient # Yield MockLLMClient for inspection if needed
 
+def make_stdin(lines):
+    """Build a binary-backed stdin replacement holding the given lines."""
+    return io.TextIOWrapper(io.BytesIO("".join(lines).encode("utf-8")), encoding="utf-8")
+
 def get_response_from_ask_mock(capsys):
     captured = capsys.readouterr()
     content = captured.out
@@ -152,6 +159,7 @@ def test_askserver_programmatic_defaults(MockLLMClient_constructor, capsys):
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is True
     assert kwargs.get('enable_rate_limiting') is True
+    assert kwargs.get('cache_enabled') is False
 
 @patch(ASKSERVER_LLMCLIENT_PATH)
 def test_askserver_programmatic_disable_logging(MockLLMClient_constructor, capsys):
@@ -190,66 +198,109 @@ def test_askserver_programmatic_all_disabled(MockLLMClient_constructor, capsys):
 
 # --- CLI Control Tests ---
 
-@patch(MAIN_ASKSERVER_PATH) # Mock AskOnlineQuestionServer in __main__
-def test_ask_cli_defaults(MockedAskServerInMain, monkeypatch, capsys):
+@patch(MAIN_ASKSERVER_RUN_PATH)
+@patch(MAIN_ASKSERVER_INIT_PATH, return_value=None)
+def test_ask_cli_defaults(MockedAskServerInit, mock_run, monkeypatch, capsys):
     # Mandatory args for ask_online_main
     monkeypatch.setattr(sys, 'argv', ['__main__.py', '--model', 'cli/test'])
-    MockedAskServerInMain.return_value.run = MagicMock() # Prevent actual run
 
     ask_online_main()
 
-    args, kwargs = MockedAskServerInMain.call_args
+    args, kwargs = MockedAskServerInit.call_args
     assert kwargs.get('model') == 'cli/test'
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is True
     assert kwargs.get('enable_rate_limiting') is True
+    assert kwargs.get('enable_response_cache') is False
+    mock_run.assert_called_once()
 
-@patch(MAIN_ASKSERVER_PATH)
-def test_ask_cli_disable_logging(MockedAskServerInMain, monkeypatch, capsys):
+@patch(MAIN_ASKSERVER_RUN_PATH)
+@patch(MAIN_ASKSERVER_INIT_PATH, return_value=None)
+def test_ask_cli_disable_logging(MockedAskServerInit, mock_run, monkeypatch, capsys):
     monkeypatch.setattr(sys, 'argv', ['__main__.py', '--model', 'cli/test', '--disable-logging'])
-    MockedAskServerInMain.return_value.run = MagicMock()
     ask_online_main()
-    args, kwargs = MockedAskServerInMain.call_args
+    args, kwargs = MockedAskServerInit.call_args
     assert kwargs.get('enable_logging') is False
     assert kwargs.get('enable_audit_log') is True
     assert kwargs.get('enable_rate_limiting') is True
 
-@patch(MAIN_ASKSERVER_PATH)
-def test_ask_cli_disable_audit_log(MockedAskServerInMain, monkeypatch, capsys):
+@patch(MAIN_ASKSERVER_RUN_PATH)
+@patch(MAIN_ASKSERVER_INIT_PATH, return_value=None)
+def test_ask_cli_disable_audit_log(MockedAskServerInit, mock_run, monkeypatch, capsys):
     monkeypatch.setattr(sys, 'argv', ['__main__.py', '--model', 'cli/test', '--disable-audit-log'])
-    MockedAskServerInMain.return_value.run = MagicMock()
     ask_online_main()
-    args, kwargs = MockedAskServerInMain.call_args
+    args, kwargs = MockedAskServerInit.call_args
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is False
     assert kwargs.get('enable_rate_limiting') is True
 
-@patch(MAIN_ASKSERVER_PATH)
-def test_ask_cli_disable_rate_limiting(MockedAskServerInMain, monkeypatch, capsys):
+@patch(MAIN_ASKSERVER_RUN_PATH)
+@patch(MAIN_ASKSERVER_INIT_PATH, return_value=None)
+def test_ask_cli_disable_rate_limiting(MockedAskServerInit, mock_run, monkeypatch, capsys):
     monkeypatch.setattr(sys, 'argv', ['__main__.py', '--model', 'cli/test', '--disable-rate-limiting'])
-    MockedAskServerInMain.return_value.run = MagicMock()
     ask_online_main()
-    args, kwargs = MockedAskServerInMain.call_args
+    args, kwargs = MockedAskServerInit.call_args
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is True
     assert kwargs.get('enable_rate_limiting') is False
 
-@patch(MAIN_ASKSERVER_PATH)
-def test_ask_cli_all_disabled(MockedAskServerInMain, monkeypatch, capsys):
+@patch(MAIN_ASKSERVER_RUN_PATH)
+@patch(MAIN_ASKSERVER_INIT_PATH, return_value=None)
+def test_ask_cli_all_disabled(MockedAskServerInit, mock_run, monkeypatch, capsys):
     monkeypatch.setattr(sys, 'argv', [
         '__main__.py', '--model', 'cli/test',
         '--disable-logging',
         '--disable-audit-log',
         '--disable-rate-limiting'
     ])
-    MockedAskServerInMain.return_value.run = MagicMock()
     ask_online_main()
-    args, kwargs = MockedAskServerInMain.call_args
+    args, kwargs = MockedAskServerInit.call_args
     assert kwargs.get('enable_logging') is False
     assert kwargs.get('enable_audit_log') is False
     assert kwargs.get('enable_rate_limiting') is False
 
 
+@patch(MAIN_ASKSERVER_RUN_PATH)
+@patch(MAIN_ASKSERVER_INIT_PATH, return_value=None)
+def test_ask_cli_option_values(MockedAskServerInit, mock_run, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', [
+        '__main__.py', '--model=cli/test', '--system-prompt-path', 'p.txt',
+        '--llm-api-base-url', 'https://example.invalid/v1', '--max-concurrent-requests', '4'
+    ])
+    ask_online_main()
+    args, kwargs = MockedAskServerInit.call_args
+    assert kwargs.get('model') == 'cli/test'
+    assert kwargs.get('system_prompt_path') == 'p.txt'
+    assert kwargs.get('llm_api_base_url') == 'https://example.invalid/v1'
+    assert kwargs.get('max_concurrent_requests') == 4
+
+def test_ask_cli_explicit_argv(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['__main__.py', '--model', 'ignored/model'])
+    with patch.object(AskOnlineQuestionServer, "__init__", return_value=None) as mock_init, \
+         patch.object(AskOnlineQuestionServer, "run") as mock_run:
+        AskOnlineQuestionServer.cli(['--model', 'argv/model', '--disable-logging', '--enable-response-cache'])
+    kwargs = mock_init.call_args[1]
+    assert kwargs['model'] == 'argv/model'
+    assert kwargs['enable_logging'] is False
+    assert kwargs['enable_response_cache'] is True
+    mock_run.assert_called_once()
+
+@pytest.mark.parametrize("argv", [
+    ['--unknown'],
+    ['--model'],
+    ['--max-concurrent-requests', 'many'],
+])
+@patch(MAIN_ASKSERVER_RUN_PATH)
+@patch(MAIN_ASKSERVER_INIT_PATH, return_value=None)
+def test_ask_cli_invalid_arguments(MockedAskServerInit, mock_run, argv, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['__main__.py'] + argv)
+    with pytest.raises(SystemExit) as excinfo:
+        ask_online_main()
+    assert excinfo.value.code == 2
+    assert "error:" in capsys.readouterr().err
+    MockedAskServerInit.assert_not_called()
+
+
 # --- Existing Tests (adapted to use ask_server_fixture and clearer capsys handling) ---
 
 def test_ask_server_initialize(ask_server_fixture, capsys):
@@ -311,14 +362,12 @@ def test_ask_server_unknown_tool(ask_server_fixture, capsys):
     assert response["error"]["message"] == "Method not found"
     assert "Tool 'unknown_tool' not found" in response["error"]["data"]
 
-@patch('ask_online_question_mcp_server.ask_online_question_server.sys.stdin')
-def test_ask_server_run_loop_and_client_close(mock_stdin, ask_server_fixture, capsys):
+def test_ask_server_run_loop_and_client_close(ask_server_fixture, capsys, monkeypatch):
     server, _ = ask_server_fixture # Unpack the fixture
     # Server sends initial ready on run, then we send one request, then EOF.
-    mock_stdin.readline.side_effect = [
-        json.dumps({"jsonrpc": "2.0", "id": 100, "method": "initialize", "params": {}}) + '\n',
-        ""  # EOF
-    ]
+    monkeypatch.setattr(sys, "stdin", make_stdin([
+        json.dumps({"jsonrpc": "2.0", "id": 100, "method": "initialize", "params": {}}) + '\n'
+    ]))
     # Mock the close method on the llm_client *instance* from the fixture
     server.llm_client.close = MagicMock()
 
@@ -335,3 +384,124 @@ def test_ask_server_run_loop_and_client_close(mock_stdin, ask_server_fixture, ca
     # Final check that no other output is present
     final_output = capsys.readouterr().out
     assert not final_output.strip(), f"Expected no more output, but got: {final_output}"
+
+def test_ask_server_concurrent_tool_calls(ask_server_fixture, capsys, monkeypatch):
+    server, _ = ask_server_fixture
+    server.max_concurrent_requests = 2
+    barrier = threading.Barrier(2, timeout=5)
+
+    def generate_response(prompt):
+        barrier.wait()  # Both calls must be in flight at the same time
+        return {"response": f"answer to {prompt}"}
+
+    server.llm_client.generate_response.side_effect = generate_response
+    monkeypatch.setattr(sys, "stdin", make_stdin([
+        json.dumps({"jsonrpc": "2.0", "id": i, "method": "tools/call",
+                    "params": {"name": "ask_online_question", "arguments": {"prompt": f"q{i}"}}}) + '\n'
+        for i in (1, 2)
+    ]))
+
+    server.run()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.strip().splitlines()]
+    answers = {r["id"]: r["result"]["content"][0]["text"] for r in lines[1:]}
+    assert answers == {1: "answer to q1", 2: "answer to q2"}
+    server.llm_client.close.assert_called_once()
+
+def test_ask_server_response_is_compact_utf8(ask_server_fixture, capsys):
+    server, _ = ask_server_fixture
+    server.llm_client.generate_response.return_value = {"response": "Zürich – 東京"}
+    request = {
+        "jsonrpc": "2.0", "id": 6, "method": "tools/call",
+        "params": {"name": "ask_online_question", "arguments": {"prompt": "Where?"}}
+    }
+    server.handle_request(request)
+    out = capsys.readouterr().out
+    assert out.endswith("\n") and out.count("\n") == 1
+    assert '"id":6' in out
+    assert "Zürich – 東京" in out
+
+def test_ask_server_run_loop_parse_error(ask_server_fixture, capsys, monkeypatch):
+    server, _ = ask_server_fixture
+    monkeypatch.setattr(sys, "stdin", make_stdin(["{not json\n"]))
+
+    server.run()
+
+    response = get_response_from_ask_mock(capsys)
+    assert response["id"] is None
+    assert response["error"]["code"] == -32700
+
+
+def test_json_rpc_request_from_message():
+    req = JsonRpcRequest.from_message({
+        "jsonrpc": "2.0", "id": 7, "method": "tools/call",
+        "params": {"name": "ask_online_question", "arguments": {"prompt": "hi"}}
+    })
+    assert (req.id, req.method, req.name, req.args) == (7, "tools/call", "ask_online_question", {"prompt": "hi"})
+
+    bare = JsonRpcRequest.from_message({"id": 8, "method": "tools/call", "params": None})
+    assert (bare.name, bare.args) == (None, {})
+
+
+@pytest.mark.parametrize("message, request_id", [
+    ("not a request", None),
+    ({"id": 3}, 3),
+    ({"id": 4, "method": 42}, 4),
+    ({"id": 5, "method": "tools/call", "params": []}, 5),
+    ({"id": 6, "method": "tools/call", "params": {"arguments": "prompt"}}, 6),
+])
+def test_ask_server_rejects_malformed_requests(ask_server_fixture, capsys, message, request_id):
+    server, _ = ask_server_fixture
+    server.handle_request(message)
+    response = get_response_from_ask_mock(capsys)
+    assert response["id"] == request_id
+    assert response["error"]["code"] == -32600
+    server.llm_client.generate_response.assert_not_called()
+
+
+def test_ask_server_unknown_method(ask_server_fixture, capsys):
+    server, _ = ask_server_fixture
+    server.handle_request({"jsonrpc": "2.0", "id": 9, "method": "prompts/list"})
+    response = get_response_from_ask_mock(capsys)
+    assert response["error"]["code"] == -32601
+    assert response["error"]["data"] == "Method 'prompts/list' not found"
+
+def test_ask_server_batch_request(ask_server_fixture, capsys):
+    server, _ = ask_server_fixture
+    server.handle_request([
+        {"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/call",
+         "params": {"name": "ask_online_question", "arguments": {"prompt": "q"}}},
+        "not a request",
+    ])
+    out = capsys.readouterr().out
+    assert out.count("\n") == 1
+    responses = json.loads(out)
+    assert [r["id"] for r in responses] == [1, 2, None]
+    assert "ask_online_question" in responses[0]["result"]["tools"]
+    assert responses[1]["result"]["content"][0]["text"] == "Mocked online question LLM response"
+    assert responses[2]["error"]["code"] == -32600
+
+
+def test_ask_server_empty_batch_is_invalid(ask_server_fixture, capsys):
+    server, _ = ask_server_fixture
+    server.handle_request([])
+    response = get_response_from_ask_mock(capsys)
+    assert response["error"]["code"] == -32600
+
+
+def test_ask_server_run_loop_batch_with_workers(ask_server_fixture, capsys, monkeypatch):
+    server, _ = ask_server_fixture
+    server.max_concurrent_requests = 2
+    batch = [
+        {"jsonrpc": "2.0", "id": i, "method": "tools/call",
+         "params": {"name": "ask_online_question", "arguments": {"prompt": f"q{i}"}}}
+        for i in (1, 2)
+    ]
+    monkeypatch.setattr(sys, "stdin", make_stdin([json.dumps(batch) + "\n"]))
+
+    server.run()
+
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert len(lines) == 2  # handshake + one batch frame
+    assert [r["id"] for r in json.loads(lines[1])] == [1, 2]
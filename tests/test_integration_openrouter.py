@@ -158,7 +158,7 @@ class TestOpenRouterIntegration:
         # Pass the invalid API key directly to LLMClient
         client_unauth = LLMClient(model=TEST_MODEL, api_key="sk-thisisprobablynotavalidkey12345") # Init should pass
         
-        # Mock requests.post to simulate an unauthorized response by raising HTTPError
+        # Mock the client's session post to simulate an unauthorized response by raising HTTPError
         mock_response = MagicMock()
         mock_response.status_code = 401
         mock_response.reason = "Unauthorized"
@@ -170,7 +170,7 @@ class TestOpenRouterIntegration:
                 response=mock_response
             )
         mock_response.raise_for_status.side_effect = raise_401_for_status
-        monkeypatch.setattr(requests, "post", lambda *args, **kwargs: mock_response)
+        monkeypatch.setattr(client_unauth._session, "post", lambda *args, **kwargs: mock_response)
 
         with pytest.raises(RuntimeError) as excinfo:
             client_unauth.generate_response("This should fail.")
@@ -0,0 +1,84 @@
+import builtins
+import importlib
+import io
+import json
+
+import pytest
+
+import llm_wrapper_mcp_server.json_codec as json_codec
+
+
+@pytest.fixture
+def stdlib_codec(monkeypatch):
+    """Reload json_codec as if orjson were not installed."""
+    real_import = builtins.__import__
+
+    def fake_import(name, *args, **kwargs):
+        if name == "orjson":
+            raise ImportError("No module named 'orjson'")
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", fake_import)
+    module = importlib.reload(json_codec)
+    yield module
+    monkeypatch.undo()
+    importlib.reload(json_codec)
+
+
+def test_dumps_is_compact_utf8_bytes():
+    data = json_codec.dumps({"id": 1, "text": "Zürich"})
+    assert isinstance(data, bytes)
+    assert json.loads(data) == {"id": 1, "text": "Zürich"}
+    assert b" " not in data
+    assert "Zürich".encode("utf-8") in data
+
+
+def test_stdlib_fallback_matches(stdlib_codec):
+    assert stdlib_codec.orjson is None
+    assert stdlib_codec.dumps({"a": [1, 2], "b": "é"}) == '{"a":[1,2],"b":"é"}'.encode("utf-8")
+    assert stdlib_codec.loads('{"a": 1}') == {"a": 1}
+    with pytest.raises(stdlib_codec.JSONDecodeError):
+        stdlib_codec.loads("{not json")
+
+
+def test_decode_error_is_json_decode_error():
+    with pytest.raises(json.JSONDecodeError):
+        json_codec.loads("{not json")
+
+
+def test_write_line_binary_and_text_streams():
+    binary = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    json_codec.write_line(b'{"id":1}', binary)
+    assert binary.buffer.getvalue() == b'{"id":1}\n'
+
+    text = io.StringIO()
+    json_codec.write_line('{"t":"é"}'.encode("utf-8"), text)
+    assert text.getvalue() == '{"t":"é"}\n'
+
+
+def test_write_lines_terminates_every_frame():
+    binary = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    json_codec.write_lines([b'{"id":1}', b'{"id":2}'], binary)
+    assert binary.buffer.getvalue() == b'{"id":1}\n{"id":2}\n'
+
+    text = io.StringIO()
+    json_codec.write_lines(iter([b'{"id":1}', b'{"id":2}']), text)
+    assert text.getvalue() == '{"id":1}\n{"id":2}\n'
+
+
+def test_frame_matches_full_serialization():
+    tail = json_codec.prebuild_tail(result={"tools": {"t": {}}})
+    for request_id in (1, "abc", None):
+        expected = {"jsonrpc": "2.0", "id": request_id, "result": {"tools": {"t": {}}}}
+        assert json.loads(json_codec.frame(request_id, tail)) == expected
+
+
+def test_error_frame_matches_full_serialization():
+    prebuilt = json_codec.prebuild_error(-32602, "Invalid params")
+    for request_id in (7, "abc", None):
+        expected = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {"code": -32602, "message": "Invalid params", "data": "Tool 'é' not found"},
+        }
+        assert json.loads(json_codec.error_frame(request_id, prebuilt, "Tool 'é' not found")) == expected
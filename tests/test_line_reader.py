@@ -0,0 +1,61 @@
+import io
+import os
+
+from llm_wrapper_mcp_server.line_reader import LineReader
+
+
+def _binary_stream(data: bytes) -> io.TextIOWrapper:
+    return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+
+
+def test_reads_every_frame_from_one_chunk():
+    reader = LineReader(_binary_stream(b'{"id":1}\n{"id":2}\n{"id":3}\n'))
+    assert [reader.readline() for _ in range(4)] == [b'{"id":1}', b'{"id":2}', b'{"id":3}', None]
+
+
+def test_frame_split_across_chunks():
+    reader = LineReader(_binary_stream(b'{"id":1}\n{"id":2}\n'), chunk_size=5)
+    assert reader.readline() == b'{"id":1}'
+    assert reader.readline() == b'{"id":2}'
+    assert reader.readline() is None
+
+
+def test_unterminated_last_frame_is_returned():
+    reader = LineReader(_binary_stream(b'{"id":1}'))
+    assert reader.readline() == b'{"id":1}'
+    assert reader.readline() is None
+
+
+def test_text_only_stream():
+    reader = LineReader(io.StringIO('{"t":"é"}\n'))
+    assert reader.readline() == '{"t":"é"}'.encode("utf-8")
+    assert reader.readline() is None
+
+
+def test_reads_from_file_descriptor():
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b'{"id":1}\n{"id":2}\n')
+    os.close(write_fd)
+    with os.fdopen(read_fd, "r", encoding="utf-8") as stream:
+        reader = LineReader(stream)
+        assert reader.readline() == b'{"id":1}'
+        assert reader.readline() == b'{"id":2}'
+        assert reader.readline() is None
+
+
+def test_has_buffered_line():
+    reader = LineReader(_binary_stream(b'{"id":1}\n{"id":2}\n'))
+    assert not reader.has_buffered_line
+    reader.readline()
+    assert reader.has_buffered_line
+    reader.readline()
+    assert not reader.has_buffered_line
+
+
+def test_large_frame_over_many_chunks():
+    big = b'{"prompt":"' + b"x" * 10000 + b'"}'
+    reader = LineReader(_binary_stream(big + b"\n" + b'{"id":2}\n'), chunk_size=64)
+    first = reader.readline()
+    assert first == big and type(first) is bytes
+    assert reader.readline() == b'{"id":2}'
+    assert reader.readline() is None
@@ -1,15 +1,18 @@
+import json
 import os
 import pytest
 import requests
 import logging
-from unittest.mock import patch, Mock, MagicMock, call
-from src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core import LLMClient # Updated import
+import threading
+from unittest.mock import patch, Mock, MagicMock, PropertyMock, call
+from src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core import LLMClient, count_tokens_fast # Updated import
 from src.llm_wrapper_mcp_server.llm_client_parts._api_key_filter import ApiKeyFilter
 from src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core import logger # Import logger from the core module
+from src.llm_wrapper_mcp_server.logger import TRACE_LEVEL
 
 # Define paths for frequently mocked objects
 LLM_ACCOUNTING_MANAGER_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.LLMAccountingManager"
-REQUESTS_POST_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.requests.post"
+REQUESTS_POST_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.requests.Session.post"
 OS_GETENV_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.os.getenv"
 TIKTOKEN_GET_ENCODING_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.tiktoken.get_encoding"
 LOGGER_WARNING_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.logger.warning"
@@ -55,6 +58,18 @@ def test_invalid_api_key_format(monkeypatch):
     with pytest.raises(ValueError, match="Invalid OPENROUTER_API_KEY format"):
         LLMClient(system_prompt_path=DUMMY_SYSTEM_PROMPT_PATH)
 
+@pytest.mark.parametrize("key", ["sk-short", "sk-has a space-1234567890abcdefgh", "xx-valid-test-key-1234567890abcdef"])
+def test_invalid_api_key_rejected(monkeypatch, key):
+    monkeypatch.setenv("OPENROUTER_API_KEY", key)
+    with pytest.raises(ValueError, match="Invalid OPENROUTER_API_KEY format"):
+        LLMClient(system_prompt_path=DUMMY_SYSTEM_PROMPT_PATH)
+
+def test_api_key_never_logged_at_init(mock_env, caplog):
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        client = LLMClient(system_prompt_path=DUMMY_SYSTEM_PROMPT_PATH)
+    assert client.api_key not in caplog.text
+    assert "***REDACTED***" not in caplog.text
+
 def test_system_prompt_loading(tmp_path):
     prompt_file = tmp_path / "system.txt"
     prompt_file.write_text("Test system prompt")
@@ -63,6 +78,21 @@ def test_system_prompt_loading(tmp_path):
         client = LLMClient(system_prompt_path=str(prompt_file))
     assert client.system_prompt == "Test system prompt"
 
+def test_system_prompt_file_read_cached_until_modified(tmp_path):
+    from src.llm_wrapper_mcp_server.llm_client_parts._config import load_system_prompt
+    prompt_file = tmp_path / "system.txt"
+    prompt_file.write_text("v1")
+    os.utime(prompt_file, ns=(1_000_000_000, 1_000_000_000))
+
+    with patch("builtins.open", wraps=open) as mock_open:
+        assert load_system_prompt(str(prompt_file)) == "v1"
+        assert load_system_prompt(str(prompt_file)) == "v1"
+    assert mock_open.call_count == 1
+
+    prompt_file.write_text("v2")
+    os.utime(prompt_file, ns=(2_000_000_000, 2_000_000_000))
+    assert load_system_prompt(str(prompt_file)) == "v2"
+
 def test_missing_system_prompt_file(caplog, mock_env): # Added mock_env
     # Ensure API key is set to avoid ValueError during LLMClient init
     with patch(OS_GETENV_PATH, return_value="sk-valid-test-key-1234567890abcdef"):
@@ -76,9 +106,9 @@ def test_missing_system_prompt_file(caplog, mock_env): # Added mock_env
 def test_successful_response(MockLLMAccountingManager, mock_post, mock_env, create_dummy_system_prompt_file): # client fixture removed
     mock_response = Mock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {
+    mock_response.content = json.dumps({
         "choices": [{"message": {"content": "Test response", "role": "assistant"}}], "id": "cmpl-123"
-    }
+    }).encode("utf-8")
     mock_response.headers = {"X-Total-Tokens": "100", "X-Prompt-Tokens": "80", "X-Completion-Tokens": "20", "X-Total-Cost": "0.05"}
     mock_response.text = '{"choices":[{"message":{"content":"Test response"}}]}'
     mock_post.return_value = mock_response
@@ -103,12 +133,7 @@ def test_api_key_redaction(MockLLMAccountingManager, mock_logger_warning, mock_g
     assert "(API key redacted due to security reasons)" in redacted
     assert client.api_key not in redacted
     
-    # Expect two warning calls: one for rate limiting, one for redaction
-    expected_calls = [
-        call("Rate limiting is enabled but not yet implemented in LLMClient."),
-        call("Redacting API key from response content")
-    ]
-    mock_logger_warning.assert_has_calls(expected_calls, any_order=True)
+    mock_logger_warning.assert_called_once_with("Redacting API key from response content")
 
 @patch(LLM_ACCOUNTING_MANAGER_PATH) # Patch the manager for this test
 def test_response_redaction_disabled(mock_accounting_manager, mock_env, create_dummy_system_prompt_file): # client fixture handles env
@@ -129,7 +154,7 @@ def test_response_redaction_disabled(mock_accounting_manager, mock_env, create_d
 def test_accounting_disabled(MockAuditLogger, MockLLMAccounting, mock_post, mock_getenv, mock_get_encoding, mock_env, create_dummy_system_prompt_file):
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "Test response"}}], "id": "cmpl-123"}
+    mock_response.content = json.dumps({"choices": [{"message": {"content": "Test response"}}], "id": "cmpl-123"}).encode("utf-8")
     mock_response.headers = {"X-Prompt-Tokens": "10", "X-Completion-Tokens": "5", "X-Total-Tokens": "15", "X-Total-Cost": "0.001"}
     mock_post.return_value = mock_response
 
@@ -152,7 +177,7 @@ def test_accounting_disabled(MockAuditLogger, MockLLMAccounting, mock_post, mock
 def test_audit_log_disabled(MockAuditLogger, MockLLMAccounting, mock_post, mock_getenv, mock_get_encoding, mock_env, create_dummy_system_prompt_file):
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "Test response"}}], "id": "cmpl-123"}
+    mock_response.content = json.dumps({"choices": [{"message": {"content": "Test response"}}], "id": "cmpl-123"}).encode("utf-8")
     mock_response.headers = {"X-Prompt-Tokens": "10", "X-Completion-Tokens": "5", "X-Total-Tokens": "15", "X-Total-Cost": "0.001"}
     mock_post.return_value = mock_response
 
@@ -175,7 +200,7 @@ def test_audit_log_disabled(MockAuditLogger, MockLLMAccounting, mock_post, mock_
 def test_both_disabled(MockAuditLogger, MockLLMAccounting, mock_post, mock_getenv, mock_get_encoding, mock_env, create_dummy_system_prompt_file):
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {"choices": [{"message": {"content": "Test response"}}], "id": "cmpl-123"}
+    mock_response.content = json.dumps({"choices": [{"message": {"content": "Test response"}}], "id": "cmpl-123"}).encode("utf-8")
     mock_response.headers = {"X-Prompt-Tokens": "10", "X-Completion-Tokens": "5", "X-Total-Tokens": "15", "X-Total-Cost": "0.001"}
     mock_post.return_value = mock_response
 
@@ -197,18 +222,17 @@ def test_both_disabled(MockAuditLogger, MockLLMAccounting, mock_post, mock_geten
 @patch(REQUESTS_POST_PATH) # Keep other mocks for full client init
 @patch(LLM_ACCOUNTING_MANAGER_PATH) # Patch the manager for this test
 def test_rate_limiting_parameter_and_warning(MockLLMAccountingManager, mock_post, mock_getenv, mock_get_encoding, mock_logger_warning, tmp_path):
-    # This test primarily checks if enable_rate_limiting is stored and if the warning is issued.
+    # This test checks that enable_rate_limiting is stored and controls the limiter.
     client_enabled = LLMClient(system_prompt_path=DUMMY_SYSTEM_PROMPT_PATH, enable_rate_limiting=True)
     assert client_enabled.enable_rate_limiting is True
-    mock_logger_warning.assert_any_call("Rate limiting is enabled but not yet implemented in LLMClient.")
-
-    mock_logger_warning.reset_mock() # Reset mock for the next instantiation
+    assert client_enabled._rate_limiter is not None
+    # Rate limiting is implemented now, so the old placeholder warning is gone
+    for call_args in mock_logger_warning.call_args_list:
+        assert "not yet implemented" not in call_args[0][0]
 
     client_disabled = LLMClient(system_prompt_path=DUMMY_SYSTEM_PROMPT_PATH, enable_rate_limiting=False)
     assert client_disabled.enable_rate_limiting is False
-    # Ensure no warning if rate limiting is disabled
-    for call_args in mock_logger_warning.call_args_list:
-        assert "Rate limiting is enabled but not yet implemented in LLMClient." not in call_args[0][0]
+    assert client_disabled._rate_limiter is None
 
 # --- Placeholder for the rest of the existing tests ---
 # Make sure to re-insert all original tests from the read_files output if they were not shown above.
@@ -240,7 +264,7 @@ def test_network_error_handling(mock_accounting_manager, mock_post, client): # c
 def test_malformed_response_handling(mock_accounting_manager, mock_post, client): # client fixture
     mock_response = Mock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {"invalid": "response"}
+    mock_response.content = json.dumps({"invalid": "response"}).encode("utf-8")
     mock_response.headers = {}
     mock_post.return_value = mock_response
 
@@ -253,14 +277,15 @@ def test_malformed_response_handling(mock_accounting_manager, mock_post, client)
 def test_request_headers(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file): # client fixture removed
     client = LLMClient(system_prompt_path=create_dummy_system_prompt_file)
     mock_post.return_value.status_code = 200
-    mock_post.return_value.json.return_value = {
+    mock_post.return_value.content = json.dumps({
         "choices": [{"message": {"content": "test"}}], "id": "cmpl-dummy"
-    }
+    }).encode("utf-8")
     mock_post.return_value.headers = {"X-Total-Tokens": "10", "X-Prompt-Tokens": "5", "X-Completion-Tokens": "5", "X-Total-Cost": "0.001"}
 
     client.generate_response("test")
 
-    headers = mock_post.call_args[1]["headers"]
+    mock_post.assert_called_once()
+    headers = client._session.headers
     assert headers["X-Title"] == "Ask MCP Server"
     assert headers["X-API-Version"] == "1"
     assert "Authorization" in headers
@@ -275,9 +300,9 @@ def test_token_counting_special_chars(mock_accounting_manager, mock_post, mock_e
 
     mock_response = Mock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {
+    mock_response.content = json.dumps({
         "choices": [{"message": {"content": "Test response"}}], "id": "cmpl-dummy"
-    }
+    }).encode("utf-8")
     mock_response.headers = {"X-Total-Tokens": "10", "X-Prompt-Tokens": "5", "X-Completion-Tokens": "5", "X-Total-Cost": "0.001"}
     mock_post.return_value = mock_response
 
@@ -309,3 +334,440 @@ def test_default_base_url(monkeypatch, create_dummy_system_prompt_file):
     monkeypatch.setenv("OPENROUTER_API_KEY", "sk-valid-test-key-1234567890abcdef")
     client = LLMClient(system_prompt_path=create_dummy_system_prompt_file)
     assert client.base_url == "https://openrouter.ai/api/v1"
+
+def _mock_completion(content="Cached response"):
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.content = json.dumps({
+        "choices": [{"message": {"content": content}}], "id": "cmpl-cache"
+    }).encode("utf-8")
+    mock_response.headers = {"X-Total-Tokens": "10", "X-Prompt-Tokens": "5", "X-Completion-Tokens": "5", "X-Total-Cost": "0.001"}
+    return mock_response
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_response_cache_hit_skips_request(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    mock_post.return_value = _mock_completion()
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=True)
+
+    first = client.generate_response("Same prompt")
+    first["response"] = "mutated by caller"
+    second = client.generate_response("Same prompt")
+
+    assert mock_post.call_count == 1
+    assert second["response"] == "Cached response"
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_response_cache_misses_on_different_prompt(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    mock_post.return_value = _mock_completion()
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=True)
+
+    client.generate_response("First prompt")
+    client.generate_response("Second prompt")
+    client.generate_response("First prompt", max_tokens=10)
+
+    assert mock_post.call_count == 3
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_response_cache_disabled_by_default(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    mock_post.return_value = _mock_completion()
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file)
+
+    client.generate_response("Same prompt")
+    client.generate_response("Same prompt")
+
+    assert mock_post.call_count == 2
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_response_cache_evicts_least_recently_used(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    mock_post.return_value = _mock_completion()
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=True, cache_max_entries=2)
+
+    client.generate_response("a")
+    client.generate_response("b")
+    client.generate_response("a")  # refresh "a"
+    client.generate_response("c")  # evicts "b"
+    client.generate_response("a")
+    assert mock_post.call_count == 3
+    client.generate_response("b")
+    assert mock_post.call_count == 4
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_system_prompt_tokenized_once(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+    client.encoder = MagicMock(wraps=client.encoder)
+
+    client.generate_response("first prompt")
+    client.generate_response("first prompt")
+
+    encoded_texts = [c[0][0] for c in client.encoder.encode_ordinary.call_args_list]
+    assert client.system_prompt not in encoded_texts
+    assert encoded_texts.count("first prompt") <= 1
+
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_session_reused_and_closed(mock_accounting_manager, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file)
+    retries = client._session.get_adapter("https://openrouter.ai").max_retries
+    assert retries.total == 2 and retries.connect == 2
+    with patch.object(client._session, "close") as mock_close:
+        client.close()
+    mock_close.assert_called_once()
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_token_counting_runs_off_request_thread(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("four token reply")
+    real_encode = client.encoder.encode_ordinary
+    encode_threads = []
+
+    def tracking_encode(text):
+        encode_threads.append(threading.current_thread().name)
+        return real_encode(text)
+
+    client.encoder = MagicMock()
+    client.encoder.encode_ordinary.side_effect = tracking_encode
+
+    response = client.generate_response("count me")
+
+    assert response["output_tokens"] == len(real_encode("four token reply"))
+    assert len(encode_threads) == 2
+    assert all(name.startswith("llm-token-count") for name in encode_threads)
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_estimated_token_counts_skip_tiktoken(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(
+        system_prompt_path=create_dummy_system_prompt_file,
+        cache_enabled=False,
+        exact_token_counts=False,
+    )
+    mock_post.return_value = _mock_completion("a reply of some length")
+    client.encoder = MagicMock()
+
+    response = client.generate_response("sixteen chars!!!")
+
+    client.encoder.encode_ordinary.assert_not_called()
+    assert response["input_tokens"] == count_tokens_fast(client.system_prompt) + 4
+    assert response["output_tokens"] == count_tokens_fast("a reply of some length")
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_payload_dumps_only_at_trace_level(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file, caplog):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+    response_text = PropertyMock(return_value="ok body")
+    type(mock_post.return_value).text = response_text
+
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        client.generate_response("quiet")
+    assert "Request payload" not in caplog.text
+    response_text.assert_not_called()
+
+    with caplog.at_level(TRACE_LEVEL, logger=logger.name):
+        client.generate_response("loud")
+    assert "Request payload" in caplog.text
+    assert 'Response content (first 200 chars): {"choices"' in caplog.text
+    assert "Request headers" in caplog.text
+    # The body prefix is decoded from response.content, never the full .text
+    response_text.assert_not_called()
+    assert client.api_key not in caplog.text
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_request_payload_messages(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+
+    client.generate_response("first")
+    client.system_prompt = "Updated system prompt."
+    client.generate_response("second")
+
+    payloads = [json.loads(c[1]["data"]) for c in mock_post.call_args_list]
+    assert payloads[0]["messages"][1] == {"role": "user", "content": "first"}
+    assert payloads[1]["messages"] == [
+        {"role": "system", "content": "Updated system prompt."},
+        {"role": "user", "content": "second"},
+    ]
+    assert payloads[0]["messages"][0]["content"] != "Updated system prompt."
+
+@pytest.mark.parametrize("model, cached", [
+    ("anthropic/claude-3.5-sonnet", True),
+    ("google/gemini-2.5-pro", True),
+    ("perplexity/llama-3.1-sonar-small-128k-online", False),
+    ("openai/gpt-4o", False),
+])
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_system_prompt_cache_control(mock_accounting_manager, mock_post, model, cached, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, model=model, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+
+    client.generate_response("hello")
+
+    system_message = json.loads(mock_post.call_args[1]["data"])["messages"][0]
+    if cached:
+        assert system_message["content"] == [{
+            "type": "text",
+            "text": client.system_prompt,
+            "cache_control": {"type": "ephemeral"},
+        }]
+    else:
+        assert system_message["content"] == client.system_prompt
+
+def test_tiktoken_cache_dir_configuration(monkeypatch, tmp_path):
+    from src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core import _configure_tiktoken_cache
+
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR", raising=False)
+    monkeypatch.delenv("DATA_GYM_CACHE_DIR", raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    _configure_tiktoken_cache()
+    assert os.environ["TIKTOKEN_CACHE_DIR"] == os.path.join(str(tmp_path), ".cache", "tiktoken")
+    assert os.path.isdir(os.environ["TIKTOKEN_CACHE_DIR"])
+
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", "/explicit/dir")
+    _configure_tiktoken_cache()
+    assert os.environ["TIKTOKEN_CACHE_DIR"] == "/explicit/dir"
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_non_json_response_body(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_response = _mock_completion("unused")
+    mock_response.content = b"<html>Bad gateway</html>"
+    mock_post.return_value = mock_response
+
+    with pytest.raises(RuntimeError, match="Invalid API response format"):
+        client.generate_response("hello")
+    mock_response.json.assert_not_called()
+
+def test_api_key_filter_redacts_only_when_key_present():
+    key = "sk-filter-test-key-1234567890abcdef"
+    api_filter = ApiKeyFilter(key)
+    clean = logging.LogRecord("t", logging.INFO, __file__, 1, "nothing secret here", None, None)
+    leaked = logging.LogRecord("t", logging.INFO, __file__, 1, f"key={key}", None, None)
+    non_str = logging.LogRecord("t", logging.INFO, __file__, 1, {"key": key}, None, None)
+
+    msg = clean.msg
+    assert api_filter.filter(clean) and clean.msg is msg
+    assert api_filter.filter(leaked) and leaked.msg == "key=***REDACTED***"
+    assert api_filter.filter(non_str) and key not in non_str.msg
+
+def test_api_key_filter_redacts_several_keys_in_one_pass():
+    api_filter = ApiKeyFilter("sk-first-key-1234567890abcdef0000")
+    api_filter.add_key("sk-second-key-1234567890abcdef000")
+    api_filter.add_key("sk-first-key-1234567890abcdef0000")
+    assert len(api_filter.api_keys) == 2
+    record = logging.LogRecord(
+        "t", logging.INFO, __file__, 1,
+        "a=sk-first-key-1234567890abcdef0000 b=sk-second-key-1234567890abcdef000", None, None,
+    )
+    api_filter.filter(record)
+    assert record.msg == "a=***REDACTED*** b=***REDACTED***"
+
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_clients_share_one_logger_filter(mock_accounting_manager, mock_env, create_dummy_system_prompt_file):
+    LLMClient(system_prompt_path=create_dummy_system_prompt_file)
+    LLMClient(system_prompt_path=create_dummy_system_prompt_file, api_key="sk-other-client-key-1234567890abcdef")
+    filters = [f for f in logger.filters if isinstance(f, ApiKeyFilter)]
+    assert len(filters) == 1
+    assert "sk-other-client-key-1234567890abcdef" in filters[0].api_keys
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_request_body_is_compact_utf8_json(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+
+    client.generate_response("Zürich?")
+
+    body = mock_post.call_args[1]["data"]
+    assert isinstance(body, bytes)
+    assert "Zürich?".encode("utf-8") in body
+    assert "json" not in mock_post.call_args[1]
+    assert client._session.headers["Content-Type"] == "application/json"
+
+
+def test_accounting_manager_shares_one_backend(monkeypatch, tmp_path):
+    from src.llm_wrapper_mcp_server.llm_client_parts._accounting import LLMAccountingManager
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("LLM_ACCOUNTING_DB_URL", raising=False)
+    with patch("src.llm_wrapper_mcp_server.llm_client_parts._accounting.MockBackend") as MockBackend:
+        manager = LLMAccountingManager(enable_logging=True, enable_audit_log=True)
+        tracker, audit_logger = manager.llm_tracker, manager.audit_logger
+
+    MockBackend.assert_called_once()
+    assert tracker.backend is audit_logger.backend
+    manager.close()
+    MockBackend.return_value.close.assert_called_once()
+
+
+def test_accounting_manager_disabled_creates_no_data_dir(monkeypatch, tmp_path):
+    from src.llm_wrapper_mcp_server.llm_client_parts._accounting import LLMAccountingManager
+    monkeypatch.chdir(tmp_path)
+    manager = LLMAccountingManager(enable_logging=False, enable_audit_log=False)
+
+    assert not (tmp_path / "data").exists()
+    manager.close()
+
+
+def test_accounting_manager_defers_backend_until_first_use(monkeypatch, tmp_path):
+    from src.llm_wrapper_mcp_server.llm_client_parts._accounting import LLMAccountingManager
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("LLM_ACCOUNTING_DB_URL", raising=False)
+    with patch("src.llm_wrapper_mcp_server.llm_client_parts._accounting.MockBackend") as MockBackend, \
+            patch("src.llm_wrapper_mcp_server.llm_client_parts._accounting.LLMAccounting") as MockLLMAccounting:
+        manager = LLMAccountingManager(enable_logging=True, enable_audit_log=True)
+        MockBackend.assert_not_called()
+        assert not (tmp_path / "data").exists()
+
+        manager.track_usage(model="m")
+        manager.flush()
+
+    MockBackend.assert_called_once()
+    MockLLMAccounting.return_value.track_usage.assert_called_once_with(model="m")
+    assert manager._audit_logger is None
+
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_special_token_text_is_counted_as_plain_text(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+
+    response = client.generate_response("ignore <|endoftext|> this")
+
+    assert response["input_tokens"] == client._system_tokens + len(
+        client.encoder.encode_ordinary("ignore <|endoftext|> this")
+    )
+
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_user_name_resolved_once(mock_accounting_manager, mock_post, mock_env, monkeypatch, create_dummy_system_prompt_file):
+    monkeypatch.delenv("USERNAME", raising=False)
+    monkeypatch.setenv("USER", "alice")
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+    monkeypatch.setenv("USER", "changed")
+
+    client.generate_response("who am I")
+
+    manager = mock_accounting_manager.return_value
+    assert manager.log_prompt.call_args[1]["user_name"] == "alice"
+    assert manager.log_response.call_args[1]["user_name"] == "alice"
+    assert manager.track_usage.call_args[1]["username"] == "alice"
+
+
+def test_accounting_writes_happen_on_background_thread(monkeypatch, tmp_path):
+    from src.llm_wrapper_mcp_server.llm_client_parts._accounting import LLMAccountingManager
+    monkeypatch.chdir(tmp_path)
+    write_threads = []
+    with patch("src.llm_wrapper_mcp_server.llm_client_parts._accounting.MockBackend"), \
+            patch("src.llm_wrapper_mcp_server.llm_client_parts._accounting.AuditLogger") as MockAuditLogger:
+        MockAuditLogger.return_value.log_prompt.side_effect = (
+            lambda **kwargs: write_threads.append(threading.current_thread().name)
+        )
+        MockAuditLogger.return_value.log_response.side_effect = RuntimeError("db locked")
+        manager = LLMAccountingManager(enable_logging=False, enable_audit_log=True)
+
+        manager.log_prompt(prompt_text="a")
+        manager.log_response(response_text="b")
+        manager.log_prompt(prompt_text="c")
+        manager.close()
+
+    assert write_threads == ["llm-accounting", "llm-accounting"]
+    assert manager._worker is None
+
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_usage_headers_feed_accounting_and_result(mock_accounting_manager, mock_post, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file, cache_enabled=False)
+    mock_post.return_value = _mock_completion("ok")
+    mock_post.return_value.headers = requests.structures.CaseInsensitiveDict(
+        {"x-total-tokens": "10", "X-Prompt-Tokens": "6", "X-Completion-Tokens": "4", "X-Total-Cost": "0.002", "X-Cached-Tokens": ""}
+    )
+
+    response = client.generate_response("usage please")
+
+    usage = mock_accounting_manager.return_value.track_usage.call_args[1]
+    assert (usage["prompt_tokens"], usage["completion_tokens"], usage["total_tokens"]) == (6, 4, 10)
+    assert usage["cost"] == 0.002
+    assert usage["cached_tokens"] == 0 and usage["reasoning_tokens"] == 0
+    assert response["api_usage"]["total_tokens"] == "10"
+    assert response["api_usage"]["reasoning_tokens"] is None
+
+
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_client_context_manager_closes_once(mock_accounting_manager, mock_env, create_dummy_system_prompt_file):
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file)
+    with patch.object(client._session, "close") as mock_close:
+        with client as entered:
+            assert entered is client
+            mock_close.assert_not_called()
+        # Exiting the block closed everything; an explicit close() is a no-op
+        client.close()
+    mock_close.assert_called_once()
+    mock_accounting_manager.return_value.close.assert_called_once()
+    assert not client._finalizer.alive
+
+
+@patch("src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.time.sleep")
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_rate_limited_request_is_retried(mock_accounting_manager, mock_post, mock_sleep, client):
+    throttled = Mock()
+    throttled.status_code = 429
+    throttled.headers = {"Retry-After": "2"}
+    mock_post.side_effect = [requests.exceptions.HTTPError(response=throttled), _mock_completion("after retry")]
+    rpm_before = client._rate_limiter.rpm
+
+    response = client.generate_response("retry me")
+
+    assert response["response"] == "after retry"
+    mock_sleep.assert_called_once_with(2.0)
+    # Halved by the 429, then one additive step back after the success
+    assert client._rate_limiter.rpm == rpm_before * 0.5 + 1
+
+
+@patch("src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.time.sleep")
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_rate_limit_retries_are_bounded(mock_accounting_manager, mock_post, mock_sleep, client):
+    throttled = Mock()
+    throttled.status_code = 429
+    throttled.headers = {}
+    mock_post.side_effect = requests.exceptions.HTTPError(response=throttled)
+
+    with pytest.raises(RuntimeError, match="API rate limit exceeded"):
+        client.generate_response("always throttled")
+
+    assert mock_post.call_count == 4
+    assert [c[0][0] for c in mock_sleep.call_args_list] == [1.0, 2.0, 4.0]
+
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_completion_post_not_retried_after_it_was_sent(mock_accounting_manager, mock_env, create_dummy_system_prompt_file):
+    from urllib3.exceptions import MaxRetryError, NewConnectionError, ReadTimeoutError
+    client = LLMClient(system_prompt_path=create_dummy_system_prompt_file)
+    retries = client._session.get_adapter("https://openrouter.ai").max_retries
+
+    # Connecting failed, so the request never reached the server: retried
+    connect_error = NewConnectionError(None, "refused")
+    assert retries.increment(method="POST", url="/chat/completions", error=connect_error).total == 1
+
+    # The request was sent; retrying could process and bill it twice
+    read_error = ReadTimeoutError(None, "/chat/completions", "timed out")
+    with pytest.raises(ReadTimeoutError):
+        retries.increment(method="POST", url="/chat/completions", error=read_error)
+    response = Mock(status=503, get_redirect_location=Mock(return_value=None))
+    with pytest.raises(MaxRetryError):
+        retries.increment(method="POST", url="/chat/completions", response=response)
+    assert not retries.is_retry("POST", 503)
+    client.close()
@@ -7,6 +7,8 @@ from llm_wrapper_mcp_server.llm_mcp_wrapper import LLMMCPWrapper
 from src.llm_wrapper_mcp_server.__main__ import main as llm_wrapper_main
 
 import io
+import threading
+import requests
 
 # Path to LLMClient where it's imported in llm_mcp_wrapper.py
 WRAPPER_LLMCLIENT_PATH = 'llm_wrapper_mcp_server.llm_mcp_wrapper.LLMClient'
@@ -21,7 +23,7 @@ def mcp_wrapper_fixture(capsys): # Add capsys here
     with patch(WRAPPER_LLMCLIENT_PATH) as MockLLMClient:
         mock_llm_client_instance = MockLLMClient.return_value
         mock_llm_client_instance.encoder = MagicMock()
-        mock_llm_client_instance.encoder.encode = MagicMock(return_value=[]) # Simulate token calculation
+        mock_llm_client_instance.encoder.encode_ordinary = MagicMock(return_value=[]) # Simulate token calculation
         mock_llm_client_instance.generate_response.return_value = {"response": "Mocked LLM response"}
         # Set a dummy api_key on the mocked instance for the temp client creation
         mock_llm_client_instance.api_key = "sk-dummyfixturekey"
@@ -38,7 +40,8 @@ def mcp_wrapper_fixture(capsys): # Add capsys here
             enable_rate_limiting=True,
             enable_audit_log=True
         )
-        # Attach the mock for LLMClient constructor to the wrapper instance for potential inspection
+        # Build the lazily created client while LLMClient is still patched
+        assert wrapper.llm_client is mock_llm_client_instance
         yield wrapper
 
 
@@ -56,15 +59,16 @@ def get_response_from_mock(capsys): # Change parameter to capsys
 
 @patch(WRAPPER_LLMCLIENT_PATH)
 def test_wrapper_programmatic_defaults(MockLLMClient_constructor, capsys): # Change parameter to capsys
-    LLMMCPWrapper() # Rely on default params
+    LLMMCPWrapper().llm_client # Rely on default params; the client is built on first use
     args, kwargs = MockLLMClient_constructor.call_args
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is True
     assert kwargs.get('enable_rate_limiting') is True
+    assert kwargs.get('cache_enabled') is False
 
 @patch(WRAPPER_LLMCLIENT_PATH)
 def test_wrapper_programmatic_disable_logging(MockLLMClient_constructor, capsys): # Change parameter to capsys
-    LLMMCPWrapper(enable_logging=False)
+    LLMMCPWrapper(enable_logging=False).llm_client
     args, kwargs = MockLLMClient_constructor.call_args
     assert kwargs.get('enable_logging') is False
     assert kwargs.get('enable_audit_log') is True
@@ -72,7 +76,7 @@ def test_wrapper_programmatic_disable_logging(MockLLMClient_constructor, capsys)
 
 @patch(WRAPPER_LLMCLIENT_PATH)
 def test_wrapper_programmatic_disable_audit_log(MockLLMClient_constructor, capsys): # Change parameter to capsys
-    LLMMCPWrapper(enable_audit_log=False)
+    LLMMCPWrapper(enable_audit_log=False).llm_client
     args, kwargs = MockLLMClient_constructor.call_args
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is False
@@ -80,7 +84,7 @@ def test_wrapper_programmatic_disable_audit_log(MockLLMClient_constructor, capsy
 
 @patch(WRAPPER_LLMCLIENT_PATH)
 def test_wrapper_programmatic_disable_rate_limiting(MockLLMClient_constructor, capsys): # Change parameter to capsys
-    LLMMCPWrapper(enable_rate_limiting=False)
+    LLMMCPWrapper(enable_rate_limiting=False).llm_client
     args, kwargs = MockLLMClient_constructor.call_args
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is True
@@ -88,7 +92,7 @@ def test_wrapper_programmatic_disable_rate_limiting(MockLLMClient_constructor, c
 
 @patch(WRAPPER_LLMCLIENT_PATH)
 def test_wrapper_programmatic_all_disabled(MockLLMClient_constructor, capsys): # Change parameter to capsys
-    LLMMCPWrapper(enable_logging=False, enable_audit_log=False, enable_rate_limiting=False)
+    LLMMCPWrapper(enable_logging=False, enable_audit_log=False, enable_rate_limiting=False).llm_client
     args, kwargs = MockLLMClient_constructor.call_args
     assert kwargs.get('enable_logging') is False
     assert kwargs.get('enable_audit_log') is False
@@ -98,7 +102,7 @@ def test_wrapper_programmatic_all_disabled(MockLLMClient_constructor, capsys): #
 def test_wrapper_temp_client_inherits_flags(MockLLMClient_constructor, capsys): # Change parameter to capsys
     # Setup main client mock part
     main_client_instance = MockLLMClient_constructor.return_value
-    main_client_instance.encoder.encode.return_value = [1,2,3] # for token counting
+    main_client_instance.encoder.encode_ordinary.return_value = [1,2,3] # for token counting
     main_client_instance.generate_response.return_value = {"response": "Mocked LLM response"}
     main_client_instance.api_key = "sk-mainclientkey"
     main_client_instance.base_url = "https://mainclient.com/api/v1"
@@ -139,9 +143,11 @@ def test_wrapper_temp_client_inherits_flags(MockLLMClient_constructor, capsys):
     with patch(WRAPPER_LLMCLIENT_PATH) as MockTempLLMClient:
         # Configure the main client on the wrapper instance to have necessary attributes
         wrapper.llm_client = MagicMock()
-        wrapper.llm_client.encoder.encode.return_value = [1,2,3]
+        wrapper.llm_client.encoder.encode_ordinary.return_value = [1,2,3]
         wrapper.llm_client.api_key = "sk-mainclientkey"
         wrapper.llm_client.base_url = "https://mainclient.com/api/v1"
+        # Drop the client pooled by the first call so a new one is built
+        wrapper._model_clients.clear()
 
         # The wrapper itself was created with enable_logging=False, enable_audit_log=True, enable_rate_limiting=False
         # These are stored as self.enable_logging etc. by the wrapper.
@@ -171,6 +177,7 @@ def test_main_cli_defaults(MockedMCPWrapperInMain, monkeypatch, capsys):
     assert kwargs.get('enable_logging') is True
     assert kwargs.get('enable_audit_log') is True
     assert kwargs.get('enable_rate_limiting') is True
+    assert kwargs.get('enable_response_cache') is False
 
 @patch('llm_wrapper_mcp_server.llm_mcp_wrapper.LLMMCPWrapper')
 def test_main_cli_disable_logging(MockedMCPWrapperInMain, monkeypatch, capsys):
@@ -232,6 +239,15 @@ def test_initialize_request(mcp_wrapper_fixture, capsys):
     assert response is not None # Add check for None
     assert response["id"] == 1
     assert "serverInfo" in response["result"]
+    assert response["result"]["capabilities"]["tools"] == mcp_wrapper_fixture.tools
+
+def test_initialize_request_string_id(mcp_wrapper_fixture, capsys):
+    capsys.readouterr()
+    mcp_wrapper_fixture.handle_request({"jsonrpc": "2.0", "id": "init-1", "method": "initialize", "params": {}})
+    response = get_response_from_mock(capsys)
+    assert response["jsonrpc"] == "2.0"
+    assert response["id"] == "init-1"
+    assert response["result"]["protocolVersion"] == "2024-11-05"
 
 def test_tools_list_request(mcp_wrapper_fixture, capsys):
     capsys.readouterr() # Clear any previous output
@@ -347,7 +363,7 @@ def test_prompt_exceeds_max_tokens(mcp_wrapper_fixture, capsys):
     # Access the mocked LLMClient instance from the fixture
     mock_llm_client_instance = mcp_wrapper_fixture.llm_client
 
-    with patch.object(mock_llm_client_instance.encoder, 'encode') as mock_encode:
+    with patch.object(mock_llm_client_instance.encoder, 'encode_ordinary') as mock_encode:
         mock_encode.return_value = [0] * (mcp_wrapper_fixture.max_user_prompt_tokens + 1)
         request = {
             "jsonrpc": "2.0",
@@ -356,12 +372,12 @@ def test_prompt_exceeds_max_tokens(mcp_wrapper_fixture, capsys):
             "params": {
                 "name": "llm_call",
                 "arguments": {
-                    "prompt": "This is a very long prompt that will exceed the token limit."
+                    "prompt": "This is a very long prompt that will exceed the token limit. " * 3
                 }
             }
         }
         mcp_wrapper_fixture.handle_request(request)
-        mock_encode.assert_called_once_with("This is a very long prompt that will exceed the token limit.")
+        mock_encode.assert_called_once_with("This is a very long prompt that will exceed the token limit. " * 3)
 
         response = get_response_from_mock(capsys)
         assert response is not None
@@ -437,3 +453,305 @@ def test_model_validation_too_short(mcp_wrapper_fixture, capsys):
     assert "error" in response
     assert response["error"]["message"] == "Invalid model specification"
     assert "Model name must be at least 2 characters" in response["error"]["data"]
+
+def test_response_is_compact_utf8(mcp_wrapper_fixture, capsys):
+    capsys.readouterr()
+    mcp_wrapper_fixture.llm_client.generate_response.return_value = {"response": "Zürich – 東京"}
+    request = {"jsonrpc": "2.0", "id": 13, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Where?"}}}
+    mcp_wrapper_fixture.handle_request(request)
+    out = capsys.readouterr().out
+    assert out.count("\n") == 1
+    assert '"id":13' in out
+    assert "Zürich – 東京" in out
+
+def test_parse_error_response(mcp_wrapper_fixture, capsys, monkeypatch):
+    capsys.readouterr()
+    monkeypatch.setattr(sys, "stdin", io.StringIO("{not json\n"))
+    assert mcp_wrapper_fixture._read_and_parse_request() is None
+    response = get_response_from_mock(capsys)
+    assert response["id"] is None
+    assert response["error"]["code"] == -32700
+
+def test_run_coalesces_burst_into_one_write(mcp_wrapper_fixture, monkeypatch):
+    requests_in = "".join(
+        json.dumps({"jsonrpc": "2.0", "id": i, "method": "tools/list"}) + "\n" for i in range(3)
+    )
+    monkeypatch.setattr(sys, "stdin", io.StringIO(requests_in))
+    # Pretend the client keeps sending, so nothing is flushed until EOF
+    monkeypatch.setattr(LLMMCPWrapper, "_input_pending", lambda self: True)
+    with patch("llm_wrapper_mcp_server.llm_mcp_wrapper.json_codec.write_lines") as mock_write:
+        mcp_wrapper_fixture.run()
+    # One write for the handshake, one for the whole burst
+    assert mock_write.call_count == 2
+    frames = mock_write.call_args_list[1][0][0]
+    assert [json.loads(f)["id"] for f in frames] == [0, 1, 2]
+
+def test_run_flushes_each_response_when_input_is_idle(mcp_wrapper_fixture, monkeypatch):
+    requests_in = "".join(
+        json.dumps({"jsonrpc": "2.0", "id": i, "method": "tools/list"}) + "\n" for i in range(2)
+    )
+    monkeypatch.setattr(sys, "stdin", io.StringIO(requests_in))
+    with patch("llm_wrapper_mcp_server.llm_mcp_wrapper.json_codec.write_lines") as mock_write:
+        mcp_wrapper_fixture.run()
+    assert mock_write.call_count == 3
+
+def test_repeated_prompt_is_tokenized_once(mcp_wrapper_fixture, capsys):
+    encode = mcp_wrapper_fixture.llm_client.encoder.encode_ordinary
+    encode.reset_mock()
+    prompt = "Same question, asked again. " * 4
+    request = {"jsonrpc": "2.0", "id": 14, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": prompt}}}
+    mcp_wrapper_fixture.handle_request(request)
+    mcp_wrapper_fixture.handle_request(dict(request, id=15))
+    encode.assert_called_once_with(prompt)
+
+def test_short_prompt_skips_tokenizer(mcp_wrapper_fixture, capsys):
+    encode = mcp_wrapper_fixture.llm_client.encoder.encode_ordinary
+    encode.reset_mock()
+    request = {"jsonrpc": "2.0", "id": 16, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Short"}}}
+    mcp_wrapper_fixture.handle_request(request)
+    encode.assert_not_called()
+    assert get_response_from_mock(capsys)["result"]["content"][0]["text"] == "Mocked LLM response"
+
+def test_huge_prompt_rejected_without_tokenizer(mcp_wrapper_fixture, capsys):
+    capsys.readouterr()
+    encoder = mcp_wrapper_fixture.llm_client.encoder
+    encoder.encode_ordinary.reset_mock()
+    encoder.token_byte_values.return_value = [b"a", b"abcd"]
+    prompt = "x" * (mcp_wrapper_fixture.max_user_prompt_tokens * 4 + 1)
+    request = {"jsonrpc": "2.0", "id": 17, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": prompt}}}
+    mcp_wrapper_fixture.handle_request(request)
+    encoder.encode_ordinary.assert_not_called()
+    assert get_response_from_mock(capsys)["error"]["code"] == -32602
+
+def test_custom_model_client_is_reused(mcp_wrapper_fixture, capsys):
+    with patch(WRAPPER_LLMCLIENT_PATH) as MockModelClient:
+        MockModelClient.return_value.generate_response.return_value = {"response": "From other model"}
+        request = {"jsonrpc": "2.0", "id": 18, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Hi", "model": "other/model"}}}
+        mcp_wrapper_fixture.handle_request(request)
+        mcp_wrapper_fixture.handle_request(dict(request, id=19))
+    MockModelClient.assert_called_once()
+    assert MockModelClient.call_args.kwargs["model"] == "other/model"
+    assert MockModelClient.return_value.generate_response.call_count == 2
+    assert get_response_from_mock(capsys)["result"]["content"][0]["text"] == "From other model"
+
+def test_custom_model_client_pool_evicts_and_closes_oldest(mcp_wrapper_fixture, monkeypatch):
+    monkeypatch.setattr("llm_wrapper_mcp_server.llm_mcp_wrapper.MODEL_CLIENT_POOL_SIZE", 2)
+    with patch(WRAPPER_LLMCLIENT_PATH, side_effect=lambda **kwargs: MagicMock(model=kwargs["model"])):
+        first = mcp_wrapper_fixture._get_llm_client_for_request("a/model")
+        mcp_wrapper_fixture._get_llm_client_for_request("b/model")
+        mcp_wrapper_fixture._get_llm_client_for_request("c/model")
+    first.close.assert_called_once()
+    assert [key[0] for key in mcp_wrapper_fixture._model_clients] == ["b/model", "c/model"]
+
+def test_non_string_method_is_method_not_found(mcp_wrapper_fixture, capsys):
+    capsys.readouterr()
+    mcp_wrapper_fixture.handle_request({"jsonrpc": "2.0", "id": 20, "method": ["tools/list"]})
+    response = get_response_from_mock(capsys)
+    assert response["id"] == 20
+    assert response["error"]["code"] == -32601
+
+def test_debug_logging_skipped_above_debug_level(mcp_wrapper_fixture, capsys):
+    with patch("llm_wrapper_mcp_server.llm_mcp_wrapper.logger") as mock_logger:
+        mock_logger.isEnabledFor.return_value = False
+        mcp_wrapper_fixture.handle_request({"jsonrpc": "2.0", "id": 21, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Hi"}}})
+    mock_logger.debug.assert_not_called()
+    assert get_response_from_mock(capsys)["id"] == 21
+
+def test_run_reads_raw_stdin_bytes(mcp_wrapper_fixture, capsys, monkeypatch):
+    frames = b'{"jsonrpc":"2.0","id":22,"method":"tools/list"}\n{"jsonrpc":"2.0","id":23,"method":"initialize"}\n'
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(frames), encoding="utf-8"))
+    capsys.readouterr()
+    mcp_wrapper_fixture.run()
+    responses = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["id"] for r in responses] == [None, 22, 23]
+
+@patch(WRAPPER_LLMCLIENT_PATH)
+def test_llm_client_built_on_first_tool_call(MockLLMClient_constructor, capsys, monkeypatch):
+    MockLLMClient_constructor.return_value.generate_response.return_value = {"response": "ok"}
+    wrapper = LLMMCPWrapper(skip_outbound_key_checks=True)
+    frames = '{"jsonrpc":"2.0","id":1,"method":"initialize"}\n{"jsonrpc":"2.0","id":2,"method":"tools/list"}\n'
+    monkeypatch.setattr(sys, "stdin", io.StringIO(frames))
+    wrapper.run()
+    MockLLMClient_constructor.assert_not_called()
+
+    wrapper.handle_request({"jsonrpc": "2.0", "id": 3, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Hi"}}})
+    MockLLMClient_constructor.assert_called_once()
+
+def test_run_sends_server_ready_handshake(mcp_wrapper_fixture, capsys, monkeypatch):
+    monkeypatch.setattr(sys, "stdin", io.StringIO(""))
+    capsys.readouterr()
+    mcp_wrapper_fixture.run()
+    handshake = json.loads(capsys.readouterr().out)
+    assert handshake["id"] is None
+    assert handshake["method"] == "mcp/serverReady"
+    assert handshake["params"]["serverInfo"]["name"] == "llm-wrapper-mcp-server"
+    assert handshake["params"]["capabilities"]["tools"] == mcp_wrapper_fixture.tools
+
+@pytest.mark.parametrize("debug_enabled", [False, True])
+def test_llm_call_error_traceback_only_at_debug(mcp_wrapper_fixture, capsys, debug_enabled):
+    mcp_wrapper_fixture.llm_client.generate_response.side_effect = RuntimeError("API rate limit exceeded")
+    with patch("llm_wrapper_mcp_server.llm_mcp_wrapper.logger") as mock_logger:
+        mock_logger.isEnabledFor.return_value = debug_enabled
+        mcp_wrapper_fixture.handle_request({"jsonrpc": "2.0", "id": 24, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Hi"}}})
+    assert mock_logger.error.call_args.kwargs["exc_info"] is debug_enabled
+    response = get_response_from_mock(capsys)
+    assert response["error"]["message"] == "API rate limit exceeded"
+    assert "Traceback" not in response["error"]["data"]
+
+def test_run_answers_tool_calls_concurrently(mcp_wrapper_fixture, capsys, monkeypatch):
+    mcp_wrapper_fixture.max_concurrent_requests = 2
+    barrier = threading.Barrier(2, timeout=5)
+
+    def generate_response(prompt, max_tokens=None):
+        barrier.wait()  # Both calls must be in flight at the same time
+        return {"response": f"answer to {prompt}"}
+
+    mcp_wrapper_fixture.llm_client.generate_response.side_effect = generate_response
+    frames = "".join(
+        json.dumps({"jsonrpc": "2.0", "id": i, "method": "tools/call",
+                    "params": {"name": "llm_call", "arguments": {"prompt": f"q{i}"}}}) + "\n"
+        for i in (1, 2)
+    ) + '{"jsonrpc":"2.0","id":3,"method":"tools/list"}\n'
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(frames.encode("utf-8")), encoding="utf-8"))
+    capsys.readouterr()
+
+    mcp_wrapper_fixture.run()
+
+    responses = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    answers = {r["id"]: r["result"] for r in responses[1:]}
+    assert answers[1]["content"][0]["text"] == "answer to q1"
+    assert answers[2]["content"][0]["text"] == "answer to q2"
+    assert "tools" in answers[3]
+
+@pytest.mark.parametrize("model_arg, expected", [
+    ("a/b", "a/b"),
+    ("  openai/gpt-4o  ", "openai/gpt-4o"),
+    ("perplexity/llama-3.1-sonar-small-128k-online", "perplexity/llama-3.1-sonar-small-128k-online"),
+])
+def test_validate_model_arg_accepts_provider_model(mcp_wrapper_fixture, capsys, model_arg, expected):
+    capsys.readouterr()
+    assert mcp_wrapper_fixture._validate_model_arg(model_arg, 30) == expected
+    assert capsys.readouterr().out == ""
+
+def _http_error():
+    response = MagicMock(status_code=503, reason="Service Unavailable")
+    return requests.HTTPError(response=response)
+
+@pytest.mark.parametrize("error, expected", [
+    (requests.Timeout("slow"), "LLM call timed out."),
+    (requests.ConnectTimeout("slow"), "LLM call timed out."),
+    (_http_error(), "LLM API HTTP error: 503 Service Unavailable"),
+    (requests.ConnectionError("refused"), "LLM API network error: refused"),
+    (RuntimeError("Invalid API response format: no choices"), "Invalid API response format: no choices"),
+    (RuntimeError("boom"), "Internal error: boom"),
+    (ValueError("bad"), "Internal error: bad"),
+])
+def test_llm_call_error_messages(mcp_wrapper_fixture, capsys, error, expected):
+    mcp_wrapper_fixture.llm_client.generate_response.side_effect = error
+    capsys.readouterr()
+    mcp_wrapper_fixture.handle_request({"jsonrpc": "2.0", "id": 31, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Hi"}}})
+    assert get_response_from_mock(capsys)["error"]["message"] == expected
+
+@patch(WRAPPER_LLMCLIENT_PATH)
+def test_skip_key_leaks_argv_applies_at_construction(MockLLMClient_constructor, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["server", "--skip-outbound-key-leaks"])
+    wrapper = LLMMCPWrapper()
+    assert wrapper.skip_outbound_key_checks is True
+    wrapper.llm_client
+    assert MockLLMClient_constructor.call_args.kwargs["skip_outbound_key_checks"] is True
+
+@pytest.mark.parametrize("line, expected_data", [
+    ("GET / HTTP/1.1", "Invalid JSON"),
+    ("\n", "Invalid JSON"),
+    ('"just a string"', "Invalid JSON"),
+    ('{"x":"' + "a" * 100 + '"}', "Request too large"),
+])
+def test_garbage_rejected_without_parsing(mcp_wrapper_fixture, capsys, monkeypatch, line, expected_data):
+    monkeypatch.setattr("llm_wrapper_mcp_server.llm_mcp_wrapper.MAX_REQUEST_BYTES", 64)
+    monkeypatch.setattr(sys, "stdin", io.StringIO(line + "\n"))
+    capsys.readouterr()
+    with patch("llm_wrapper_mcp_server.llm_mcp_wrapper.json_codec.loads") as mock_loads:
+        assert mcp_wrapper_fixture._read_and_parse_request() is None
+    mock_loads.assert_not_called()
+    response = get_response_from_mock(capsys)
+    assert response["error"]["code"] == -32700
+    assert response["error"]["data"] == expected_data
+
+def test_leading_whitespace_before_frame_is_accepted(mcp_wrapper_fixture, monkeypatch):
+    monkeypatch.setattr(sys, "stdin", io.StringIO('  {"jsonrpc":"2.0","id":1,"method":"tools/list"}\n'))
+    assert mcp_wrapper_fixture._read_and_parse_request()["id"] == 1
+
+def test_llm_call_success_frame_matches_full_response(mcp_wrapper_fixture, capsys):
+    text = 'Line "one"\nZürich – 東京 \\ done'
+    mcp_wrapper_fixture.llm_client.generate_response.return_value = {"response": text}
+    capsys.readouterr()
+    mcp_wrapper_fixture.handle_request({"jsonrpc": "2.0", "id": "req-7", "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": "Hi"}}})
+    assert get_response_from_mock(capsys) == {
+        "jsonrpc": "2.0",
+        "id": "req-7",
+        "result": {"content": [{"type": "text", "text": text}], "isError": False},
+    }
+
+def test_non_ascii_prompt_bounded_by_utf8_length(mcp_wrapper_fixture, capsys):
+    encoder = mcp_wrapper_fixture.llm_client.encoder
+    encoder.encode_ordinary.reset_mock()
+    encoder.token_byte_values.return_value = [b"a", b"abcd"]
+    # 100 characters but 200 bytes: not provably short, so it must be tokenized
+    prompt = "é" * mcp_wrapper_fixture.max_user_prompt_tokens
+    mcp_wrapper_fixture.handle_request({"jsonrpc": "2.0", "id": 32, "method": "tools/call", "params": {"name": "llm_call", "arguments": {"prompt": prompt}}})
+    encoder.encode_ordinary.assert_called_once_with(prompt)
+
+@pytest.mark.parametrize("max_concurrent_requests", [1, 2])
+@patch(WRAPPER_LLMCLIENT_PATH)
+def test_client_construction_error_is_per_request(MockLLMClient_constructor, capsys, monkeypatch, max_concurrent_requests):
+    MockLLMClient_constructor.side_effect = ValueError("Invalid OpenRouter API key format")
+    wrapper = LLMMCPWrapper(skip_outbound_key_checks=True, max_concurrent_requests=max_concurrent_requests)
+    frames = (
+        '{"jsonrpc":"2.0","id":1,"method":"tools/call","params":{"name":"llm_call","arguments":{"prompt":"Hi"}}}\n'
+        '{"jsonrpc":"2.0","id":2,"method":"tools/list"}\n'
+    )
+    monkeypatch.setattr(sys, "stdin", io.StringIO(frames))
+    capsys.readouterr()
+
+    wrapper.run()
+
+    responses = {r["id"]: r for r in map(json.loads, capsys.readouterr().out.splitlines()[1:])}
+    assert responses[1]["error"]["code"] == -32000
+    assert "tools" in responses[2]["result"]
+
+def test_default_client_built_once_under_concurrency(mcp_wrapper_fixture):
+    with patch(WRAPPER_LLMCLIENT_PATH) as MockLLMClient_constructor:
+        wrapper = LLMMCPWrapper(skip_outbound_key_checks=True)
+        barrier = threading.Barrier(4, timeout=5)
+        results = []
+
+        def touch():
+            barrier.wait()
+            results.append(wrapper.llm_client)
+
+        threads = [threading.Thread(target=touch) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    MockLLMClient_constructor.assert_called_once()
+    assert all(r is results[0] for r in results)
+
+@pytest.mark.parametrize("max_concurrent_requests", [1, 2])
+def test_non_object_request_is_invalid_and_loop_continues(mcp_wrapper_fixture, capsys, monkeypatch, max_concurrent_requests):
+    mcp_wrapper_fixture.max_concurrent_requests = max_concurrent_requests
+    frames = (
+        '[{"jsonrpc":"2.0","id":1,"method":"tools/list"}]\n'
+        '[]\n'
+        '{"jsonrpc":"2.0","id":2,"method":"tools/list"}\n'
+    )
+    monkeypatch.setattr(sys, "stdin", io.StringIO(frames))
+    capsys.readouterr()
+
+    with patch("llm_wrapper_mcp_server.llm_mcp_wrapper.logger") as mock_logger:
+        mock_logger.isEnabledFor.return_value = True  # exercise the debug paths too
+        mcp_wrapper_fixture.run()
+
+    responses = [json.loads(line) for line in capsys.readouterr().out.splitlines()[1:]]
+    assert [r["error"]["code"] for r in responses[:2]] == [-32600, -32600]
+    assert responses[2]["id"] == 2 and "tools" in responses[2]["result"]
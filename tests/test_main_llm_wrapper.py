@@ -4,9 +4,11 @@ from unittest.mock import patch, MagicMock, call
 import os
 import sys
 import logging
+import logging.handlers
 import io
 import gettext
 from llm_wrapper_mcp_server.__main__ import main as llm_wrapper_main
+import llm_wrapper_mcp_server.__main__ as main_module
 
 @pytest.fixture(autouse=True)
 def manage_cwd():
@@ -77,7 +79,8 @@ def test_main_llm_wrapper_custom_args(mock_llm_mcp_wrapper_constructor, mock_dep
         '--skip-outbound-key-leaks', '--server-name', 'MyTestServer',
         '--llm-api-base-url', 'https://custom.api', '--log-file', 'custom.log',
         '--log-level', 'DEBUG', '--max-tokens', '500', '--disable-logging',
-        '--disable-audit-log', '--disable-rate-limiting'
+        '--disable-audit-log', '--disable-rate-limiting', '--max-concurrent-requests', '4',
+        '--enable-response-cache'
     ]
     with patch.object(sys, 'argv', test_args):
         with patch.dict(os.environ, {"OPENROUTER_API_KEY": "sk-dummykeyfortests12345678901234"}):
@@ -87,11 +90,24 @@ def test_main_llm_wrapper_custom_args(mock_llm_mcp_wrapper_constructor, mock_dep
     call_args = mock_constructor.call_args[1]
     assert call_args['model'] == 'custom/model'
     assert call_args['skip_outbound_key_checks'] is True
+    assert call_args['max_concurrent_requests'] == 4
+    assert call_args['enable_response_cache'] is True
     mock_instance.run.assert_called_once()
-    mock_dependencies["basicConfig"].assert_called_once_with(
-        filename='custom.log', level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s', filemode='a'
-    )
+    mock_dependencies["basicConfig"].assert_called_once()
+    config_kwargs = mock_dependencies["basicConfig"].call_args[1]
+    assert config_kwargs['level'] == logging.DEBUG
+    [queue_handler] = config_kwargs['handlers']
+    assert isinstance(queue_handler, logging.handlers.QueueHandler)
+    [file_handler] = main_module._log_listener.handlers
+    assert file_handler.baseFilename == os.path.abspath('custom.log')
+    assert file_handler.formatter._fmt == '%(asctime)s - %(levelname)s - %(message)s'
+
+def test_main_llm_wrapper_trace_log_level(mock_llm_mcp_wrapper_constructor, mock_dependencies, monkeypatch):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(''))
+    with patch.object(sys, 'argv', ['__main__.py', '--log-level', 'TRACE']):
+        with patch.dict(os.environ, {"OPENROUTER_API_KEY": "sk-dummykeyfortests12345678901234"}):
+            llm_wrapper_main()
+    assert mock_dependencies["basicConfig"].call_args[1]['level'] == 5
 
 def test_main_llm_wrapper_cwd_change(mock_llm_mcp_wrapper_constructor, mock_dependencies, tmp_path, monkeypatch):
     mock_constructor, mock_instance = mock_llm_mcp_wrapper_constructor
@@ -104,6 +120,22 @@ def test_main_llm_wrapper_cwd_change(mock_llm_mcp_wrapper_constructor, mock_depe
             llm_wrapper_main()
     mock_chdir.assert_called_once_with(str(new_cwd))
 
+def test_main_llm_wrapper_cwd_equals_form(mock_llm_mcp_wrapper_constructor, mock_dependencies, tmp_path, monkeypatch):
+    mock_constructor, _ = mock_llm_mcp_wrapper_constructor
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(''))
+    with patch.object(os, 'chdir') as mock_chdir, \
+         patch.object(sys, 'argv', ['__main__.py', f'--cwd={tmp_path}', '--model', 'custom/model']):
+        with patch.dict(os.environ, {"OPENROUTER_API_KEY": "sk-dummykeyfortests12345678901234"}):
+            llm_wrapper_main()
+    mock_chdir.assert_called_once_with(str(tmp_path))
+    assert mock_constructor.call_args.kwargs['model'] == 'custom/model'
+
+def test_main_llm_wrapper_cwd_missing_value(mock_llm_mcp_wrapper_constructor, mock_dependencies, capsys):
+    with patch.object(sys, 'argv', ['__main__.py', '--cwd']), pytest.raises(SystemExit) as excinfo:
+        llm_wrapper_main()
+    assert excinfo.value.code == 2
+    assert "--cwd" in capsys.readouterr().err
+
 def test_main_llm_wrapper_allowed_models_valid(mock_llm_mcp_wrapper_constructor, mock_dependencies, tmp_path, monkeypatch):
     mock_constructor, _ = mock_llm_mcp_wrapper_constructor
     monkeypatch.setattr(sys, 'stdin', io.StringIO(''))
@@ -158,3 +190,83 @@ def test_main_llm_wrapper_allowed_models_file_not_found(mock_llm_mcp_wrapper_con
     expected_log_message = f"Allowed models file not found: {str(missing_model_file)}"
     mock_dependencies["logger"].warning.assert_any_call(expected_log_message)
     mock_constructor.assert_not_called()
+
+def test_configure_logging_writes_through_background_listener(mocker, tmp_path):
+    mock_basic_config = mocker.patch('logging.basicConfig')
+    log_file = tmp_path / "server.log"
+    main_module._configure_logging(str(log_file), "INFO")
+    [queue_handler] = mock_basic_config.call_args[1]['handlers']
+
+    record = logging.LogRecord("test", logging.WARNING, __file__, 1, "hello %s", ("world",), None)
+    queue_handler.handle(record)
+    main_module._stop_log_listener()
+
+    assert log_file.read_text().rstrip("\n").endswith(" - WARNING - hello world")
+
+def test_configure_logging_tolerates_existing_log_dir(mocker, tmp_path):
+    mocker.patch('logging.basicConfig')
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    main_module._configure_logging(str(log_dir / "server.log"), "INFO")
+    main_module._configure_logging(str(tmp_path / "new" / "server.log"), "INFO")
+    main_module._stop_log_listener()
+    assert (tmp_path / "new").is_dir()
+
+def test_buffered_file_handler_defers_low_level_records(tmp_path):
+    from llm_wrapper_mcp_server.logger import BufferedFileHandler
+    log_file = tmp_path / "buffered.log"
+    handler = BufferedFileHandler(str(log_file), delay=True, flush_interval=3600)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+
+    handler.handle(logging.LogRecord("t", logging.DEBUG, __file__, 1, "quiet", None, None))
+    assert log_file.read_text() == ""
+
+    handler.handle(logging.LogRecord("t", logging.WARNING, __file__, 1, "loud", None, None))
+    assert log_file.read_text() == "DEBUG quiet\nWARNING loud\n"
+
+    handler.handle(logging.LogRecord("t", logging.INFO, __file__, 1, "tail", None, None))
+    handler.close()
+    assert log_file.read_text().endswith("INFO tail\n")
+
+def test_local_queue_handler_defers_formatting():
+    import queue
+    from llm_wrapper_mcp_server.logger import LocalQueueHandler
+    log_queue = queue.SimpleQueue()
+    handler = LocalQueueHandler(log_queue)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("t", logging.ERROR, __file__, 1, "failed %s", ("call",), sys.exc_info())
+    handler.handle(record)
+
+    queued = log_queue.get_nowait()
+    assert queued is record
+    # Nothing was rendered on the logging thread
+    assert queued.args == ("call",)
+    assert queued.exc_text is None
+    assert "ValueError: boom" in logging.Formatter().format(queued)
+
+def test_configure_logging_twice_switches_to_new_file(tmp_path):
+    first, second = tmp_path / "first.log", tmp_path / "second.log"
+    app_logger = logging.getLogger("reconfigure-test")
+
+    main_module._configure_logging(str(first), "INFO")
+    app_logger.warning("one")
+    main_module._configure_logging(str(second), "INFO")
+    app_logger.warning("two")
+    main_module._stop_log_listener()
+
+    assert len(logging.getLogger().handlers) == 1
+    assert "one" in first.read_text() and "two" not in first.read_text()
+    assert "two" in second.read_text()
+
+def test_idle_listener_flushes_buffered_records(tmp_path):
+    import time
+    log_file = tmp_path / "idle.log"
+    main_module._configure_logging(str(log_file), "INFO")
+    # INFO is below the handler's flush level; only the idle flush writes it
+    logging.getLogger("idle-test").info("quiet line")
+    deadline = time.monotonic() + 5
+    while "quiet line" not in (log_file.read_text() if log_file.exists() else ""):
+        assert time.monotonic() < deadline, "buffered record was never flushed"
+        time.sleep(0.01)
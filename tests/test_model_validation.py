@@ -1,6 +1,7 @@
 import pytest
 import logging
 import os
+import io
 import json
 import sys
 from unittest.mock import patch, Mock
@@ -21,7 +22,7 @@ def test_valid_model_selection(mock_main_logger_warning, tmp_path):
         '--allowed-models-file', str(model_file),
         '--model', 'perplexity/llama-3.1-sonar-small-128k-online'
     ]), patch('src.llm_wrapper_mcp_server.llm_mcp_wrapper.LLMMCPWrapper.run') as mock_run, \
-         patch('sys.stdin.readline', return_value=''):
+         patch('sys.stdin', io.StringIO('')):
         mock_run.side_effect = lambda: None
         main()
 
@@ -35,7 +36,7 @@ def test_missing_model_file(mock_main_logger_warning, tmp_path):
     with patch('sys.argv', [
         'server.py',
         '--allowed-models-file', str(missing_file)
-    ]), patch('sys.stdin.readline', return_value=''), pytest.raises(SystemExit) as excinfo:
+    ]), patch('sys.stdin', io.StringIO('')), pytest.raises(SystemExit) as excinfo:
         main()
 
     assert excinfo.value.code == 1
@@ -50,7 +51,7 @@ def test_empty_model_file(mock_main_logger_warning, tmp_path):
     with patch('sys.argv', [
         'server.py',
         '--allowed-models-file', str(empty_file)
-    ]), patch('sys.stdin.readline', return_value=''), pytest.raises(SystemExit) as excinfo:
+    ]), patch('sys.stdin', io.StringIO('')), pytest.raises(SystemExit) as excinfo:
         main()
 
     assert excinfo.value.code == 1
@@ -78,7 +79,8 @@ def test_invalid_model_formatting(MockLLMClient, mocker):
         ("noslash", "Model name must contain a '/' separator"),
         ("  ", "Model name must be at least 2 characters"),
         ("/missingprovider", "Model name must contain a provider and a model separated by a single '/'"),
-        ("missingmodel/", "Model name must contain a provider and a model separated by a single '/'")
+        ("missingmodel/", "Model name must contain a provider and a model separated by a single '/'"),
+        ("too/many/slashes", "Model name must contain a provider and a model separated by a single '/'")
     ]
 
     for model, expected_error in test_cases:
@@ -122,10 +124,48 @@ def test_invalid_model_selection(mock_main_logger_warning, tmp_path):
         'server.py',
         '--allowed-models-file', str(model_file),
         '--model', 'invalid/model'
-    ]), patch('sys.stdin.readline', return_value=''), pytest.raises(SystemExit) as excinfo:
+    ]), patch('sys.stdin', io.StringIO('')), pytest.raises(SystemExit) as excinfo:
         main()
 
     assert excinfo.value.code == 1
     # Updated assertion to include the dynamic file path
     expected_log_message = f"Model 'invalid/model' is not in the allowed models list from {model_file}"
     mock_main_logger_warning.assert_called_with(expected_log_message)
+
+def test_allowed_models_file_cached_until_modified(tmp_path):
+    from src.llm_wrapper_mcp_server.__main__ import _validate_allowed_models
+    model_file = tmp_path / "models.txt"
+    model_file.write_text("allowed/model-1\n")
+    path = str(model_file)
+
+    with patch('builtins.open', wraps=open) as mock_open:
+        _validate_allowed_models("allowed/model-1", path)
+        _validate_allowed_models("allowed/model-1", path)
+    assert mock_open.call_count == 1
+
+    model_file.write_text("allowed/model-2\n")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    _validate_allowed_models("allowed/model-2", path)
+    with pytest.raises(SystemExit):
+        _validate_allowed_models("allowed/model-1", path)
+
+def test_allowed_models_file_removed_after_stat(tmp_path):
+    import src.llm_wrapper_mcp_server.__main__ as main_module
+    model_file = tmp_path / "models.txt"
+    model_file.write_text("allowed/model-1\n")
+
+    real_stat = os.stat
+    def stat_then_remove(path, *args, **kwargs):
+        result = real_stat(path, *args, **kwargs)
+        if path == str(model_file):
+            model_file.unlink()
+        return result
+
+    with patch.object(main_module.os, "stat", side_effect=stat_then_remove), \
+         patch.object(main_module.os.path, "exists") as mock_exists, \
+         patch.object(main_module.logger, "warning") as mock_warning:
+        with pytest.raises(SystemExit) as excinfo:
+            main_module._validate_allowed_models("allowed/model-1", str(model_file))
+    assert excinfo.value.code == 1
+    mock_warning.assert_called_with(f"Allowed models file not found: {model_file}")
+    mock_exists.assert_not_called()
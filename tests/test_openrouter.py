@@ -1,7 +1,8 @@
+import json
 import os
 import pytest
 import logging
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import patch, MagicMock
 from src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core import LLMClient # Updated import
 from src.llm_wrapper_mcp_server.llm_mcp_wrapper import LLMMCPWrapper
 
@@ -23,7 +24,7 @@ def redaction_setup():
     if "OPENROUTER_API_KEY" in os.environ:
         del os.environ["OPENROUTER_API_KEY"]
 
-@patch('requests.post') # Patched globally as _llm_client_core imports requests directly
+@patch('requests.Session.post') # Patched on the class as LLMClient posts through a persistent Session
 def test_api_key_redaction_enabled(mock_post, unique_db_paths, redaction_setup):
     """Test that API key is redacted when feature is enabled (default)"""
     test_api_key, mock_response_data = redaction_setup
@@ -40,9 +41,9 @@ def test_api_key_redaction_enabled(mock_post, unique_db_paths, redaction_setup):
 
         # Setup mock API response
         mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "choices": [{"message": {"content": f"Here is your key: {test_api_key}"}}]
-        }
+        }).encode("utf-8")
         mock_response.headers = {}
         mock_post.return_value = mock_response
 
@@ -54,7 +55,7 @@ def test_api_key_redaction_enabled(mock_post, unique_db_paths, redaction_setup):
         assert "(API key redacted due to security reasons)" in processed_response
         assert test_api_key not in processed_response
 
-@patch('src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.requests.post') # Corrected patch target
+@patch('src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.requests.Session.post') # Corrected patch target
 def test_api_key_redaction_disabled(mock_post, unique_db_paths, redaction_setup):
     """Test that API key remains when redaction is disabled"""
     test_api_key, mock_response_data = redaction_setup
@@ -62,9 +63,9 @@ def test_api_key_redaction_disabled(mock_post, unique_db_paths, redaction_setup)
     # Setup mock API response for requests.post
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {
+    mock_response.content = json.dumps({
         "choices": [{"message": {"content": f"Here is your key: {test_api_key}"}}]
-    }
+    }).encode("utf-8")
     mock_response.headers = {}
     mock_post.return_value = mock_response
 
@@ -91,7 +92,7 @@ def test_api_key_redaction_disabled(mock_post, unique_db_paths, redaction_setup)
         assert "(API key redacted due to security reasons)" not in processed_response
         mock_post.assert_called_once() # Assert that requests.post was called
 
-@patch('src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.requests.post') # Corrected patch target
+@patch('src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.requests.Session.post') # Corrected patch target
 @patch('src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.logger') # Corrected patch target
 def test_redaction_logging(mock_logger, mock_post, unique_db_paths, redaction_setup):
     """Test that redaction events are properly logged"""
@@ -100,9 +101,9 @@ def test_redaction_logging(mock_logger, mock_post, unique_db_paths, redaction_se
     # Setup mock API response for requests.post
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {
+    mock_response.content = json.dumps({
         "choices": [{"message": {"content": f"Here is your key: {test_api_key}"}}]
-    }
+    }).encode("utf-8")
     mock_response.headers = {}
     mock_post.return_value = mock_response
 
@@ -124,8 +125,4 @@ def test_redaction_logging(mock_logger, mock_post, unique_db_paths, redaction_se
         client.generate_response("test prompt")
 
         # Assert that the warning message was logged
-        expected_calls = [
-            call("Rate limiting is enabled but not yet implemented in LLMClient."),
-            call("Redacting API key from response content")
-        ]
-        mock_logger.warning.assert_has_calls(expected_calls, any_order=True)
+        mock_logger.warning.assert_called_once_with("Redacting API key from response content")
@@ -0,0 +1,71 @@
+import pytest
+
+from src.llm_wrapper_mcp_server.llm_client_parts._rate_limiter import (
+    DEFAULT_LIMITS,
+    RateLimiter,
+    limits_for_base_url,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://api.openai.com/v1", (60.0, 150_000.0)),
+    ("https://api.anthropic.com/v1", (50.0, 80_000.0)),
+    ("https://openrouter.ai/api/v1", DEFAULT_LIMITS),
+])
+def test_limits_for_base_url(url, expected):
+    assert limits_for_base_url(url) == expected
+
+
+def test_burst_up_to_rpm_then_paced():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rpm=60)
+    for _ in range(60):
+        assert limiter.acquire() == 0.0
+    assert limiter.acquire() == pytest.approx(1.0)
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_token_budget_delays_large_requests():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rpm=600, tpm=6000)
+    assert limiter.acquire(tokens=6000) == 0.0
+    # 600 more tokens need a tenth of the per-minute refill
+    assert limiter.acquire(tokens=600) == pytest.approx(6.0)
+
+
+def test_aimd_adjusts_rate_within_bounds():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rpm=10, min_rpm=2)
+    assert limiter.on_throttled(0) == 1.0
+    assert limiter.rpm == 5
+    limiter.on_throttled(1)
+    limiter.on_throttled(2)
+    assert limiter.rpm == 2
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.rpm == 10
+
+
+def test_throttle_honours_retry_after_up_to_max_backoff():
+    limiter = make_limiter(FakeClock(), rpm=60, max_backoff=10)
+    assert limiter.on_throttled(0, "3") == 3.0
+    assert limiter.on_throttled(0, "Wed, 21 Oct 2015 07:28:00 GMT") == 1.0
+    assert limiter.on_throttled(0, "30") is None
+    assert limiter.on_throttled(4) is None
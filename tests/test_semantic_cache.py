@@ -0,0 +1,88 @@
+import json
+import pytest
+from unittest.mock import patch, Mock
+
+np = pytest.importorskip("numpy")
+
+from src.llm_wrapper_mcp_server.llm_client_parts._semantic_cache import SemanticCache
+from src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core import LLMClient
+
+LLM_ACCOUNTING_MANAGER_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.LLMAccountingManager"
+REQUESTS_POST_PATH = "src.llm_wrapper_mcp_server.llm_client_parts._llm_client_core.requests.Session.post"
+
+
+@pytest.fixture
+def mock_env(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-valid-test-key-1234567890abcdef")
+    monkeypatch.setenv("LLM_API_BASE_URL", "https://mock.openrouter.ai/api/v1")
+
+
+def test_lookup_returns_similar_entry():
+    cache = SemanticCache(similarity_threshold=0.9)
+    cache.add("ns", SemanticCache.normalize([1.0, 0.0, 0.0]), {"response": "Paris"})
+
+    hit = cache.lookup("ns", SemanticCache.normalize([0.99, 0.05, 0.0]))
+    miss = cache.lookup("ns", SemanticCache.normalize([0.0, 1.0, 0.0]))
+
+    assert hit == {"response": "Paris"}
+    assert miss is None
+
+
+def test_lookup_is_scoped_to_namespace():
+    cache = SemanticCache()
+    cache.add("model-a", SemanticCache.normalize([1.0, 0.0]), {"response": "a"})
+    assert cache.lookup("model-b", SemanticCache.normalize([1.0, 0.0])) is None
+
+
+def test_expired_entries_are_ignored():
+    cache = SemanticCache(ttl_seconds=10)
+    with patch("src.llm_wrapper_mcp_server.llm_client_parts._semantic_cache.time.time", return_value=1000.0):
+        cache.add("ns", SemanticCache.normalize([1.0, 0.0]), {"response": "old"})
+    with patch("src.llm_wrapper_mcp_server.llm_client_parts._semantic_cache.time.time", return_value=1011.0):
+        assert cache.lookup("ns", SemanticCache.normalize([1.0, 0.0])) is None
+
+
+def test_max_entries_evicts_oldest_and_buffer_grows():
+    cache = SemanticCache(max_entries=20)
+    for i in range(25):
+        vector = np.zeros(32, dtype=np.float32)
+        vector[i % 32] = 1.0
+        cache.add("ns", vector, {"response": str(i)})
+
+    assert len(cache) == 20
+    first = np.zeros(32, dtype=np.float32)
+    first[0] = 1.0
+    assert cache.lookup("ns", first) is None
+    last = np.zeros(32, dtype=np.float32)
+    last[24] = 1.0
+    assert cache.lookup("ns", last) == {"response": "24"}
+
+
+def _post_side_effect(embeddings):
+    def side_effect(url, **kwargs):
+        response = Mock()
+        response.status_code = 200
+        if url.endswith("/embeddings"):
+            response.content = json.dumps({"data": [{"embedding": embeddings[json.loads(kwargs["data"])["input"]]}]}).encode("utf-8")
+        else:
+            response.content = json.dumps({"choices": [{"message": {"content": "Paris"}}], "id": "cmpl-1"}).encode("utf-8")
+            response.headers = {}
+        return response
+    return side_effect
+
+
+@patch(REQUESTS_POST_PATH)
+@patch(LLM_ACCOUNTING_MANAGER_PATH)
+def test_client_serves_paraphrased_prompt_from_semantic_cache(mock_accounting_manager, mock_post, mock_env):
+    mock_post.side_effect = _post_side_effect({
+        "capital of France?": [1.0, 0.0, 0.1],
+        "France's capital?": [0.98, 0.0, 0.12],
+    })
+    client = LLMClient(system_prompt_path="non_existent.txt", semantic_cache=SemanticCache())
+
+    first = client.generate_response("capital of France?")
+    second = client.generate_response("France's capital?")
+
+    completion_calls = [c for c in mock_post.call_args_list if c[0][0].endswith("/chat/completions")]
+    assert len(completion_calls) == 1
+    assert first["response"] == second["response"] == "Paris"